@@ -1,18 +1,25 @@
 import asyncio
 import logging
+import os
 import signal
 import sys
 
-import redis
 from address_parser import AddressParser
+from redis.asyncio import BlockingConnectionPool, Redis
 
 from app.config import config
+from app.coordination import LeaderLease, WorkQueue
+from app.executor import Executor
+from app.metrics import Metrics, MetricsServer
+from app.parser.normalizer import CachedNormalizer
 from app.parser.organization import OrganizationParser
 from app.parser.outage_details import OutageDetailsParser
+from app.profiling import CycleProfiler
 from app.publisher import Publisher
-from app.scheduler import PeriodicTask
-from app.scraper import Scraper
+from app.scheduler import Janitor, PeriodicTask, Schedule, ShardWorker
+from app.scraper import HostLimits, Scraper
 from app.storage import Storage
+from app.transport import RetryBudget, RetryPolicy, create_client
 
 logger = logging.getLogger(__name__)
 
@@ -23,29 +30,192 @@ async def main():
     for sig in (signal.SIGINT, signal.SIGTERM):
         loop.add_signal_handler(sig, lambda: asyncio.create_task(shutdown(loop)))
 
-    r = redis.from_url(config.redis.url, decode_responses=True)
+    pool = BlockingConnectionPool.from_url(
+        config.redis.url,
+        decode_responses=True,
+        max_connections=config.redis.max_connections,
+        timeout=config.redis.pool_timeout,
+        socket_timeout=config.redis.socket_timeout,
+        socket_connect_timeout=config.redis.socket_connect_timeout,
+        health_check_interval=config.redis.health_check_interval,
+    )
+    metrics = Metrics()
+    metrics.instrument_redis(pool)
+    r = Redis(connection_pool=pool)
     logger.info("Created Redis instance")
 
-    storage = Storage(r, config.storage.prefix, config.storage.ttl)
-    await storage.migrate()
+    metrics_server = None
+    if config.metrics.port:
+        metrics_server = MetricsServer(
+            metrics, config.metrics.host, config.metrics.port
+        )
+        await metrics_server.start()
+        logger.info(
+            "Serving metrics on %s:%d/metrics", config.metrics.host, config.metrics.port
+        )
+
+    executor = None
+    if config.executor.workers:
+        executor = Executor(config.executor.workers)
+
+    storage = Storage(
+        r,
+        config.storage.prefix,
+        config.storage.ttl,
+        mirror=config.storage.mirror,
+        legacy_v1=config.storage.legacy_v1,
+        metrics=metrics,
+        executor=executor,
+    )
+    await storage.migrate(batch_size=config.storage.cleanup_batch_size)
     logger.info("Created Storage instance")
 
-    publisher = Publisher(r, config.publisher.prefix)
-
-    async with Scraper(
-        config.scraper.url, storage=storage
-    ) as scraper, AddressParser() as address_parser:
-        task = PeriodicTask(
-            scraper=scraper,
-            storage=storage,
-            publisher=publisher,
-            outage_parser=OutageDetailsParser(address_parser),
-            organization_parser=OrganizationParser(),
-            interval=config.scraper.interval,
+    publisher = Publisher(
+        r,
+        config.publisher.prefix,
+        modes=config.publisher.modes,
+        stream_maxlen=config.publisher.stream_maxlen,
+        stream_group=config.publisher.stream_group,
+        # Replicas processing the same record after a failover publish it once
+        idempotency_ttl=config.storage.ttl if config.coordination.enabled else None,
+        # Expires before the area is taken over, so the replica claiming it
+        # can send the outages of a replica that died after claiming them
+        claim_ttl=config.coordination.claim_idle / 2,
+    )
+    await publisher.setup()
+    logger.info("Created Publisher instance: %s", ", ".join(publisher.modes))
+
+    async with create_client(
+        connect_timeout=config.scraper.connect_timeout,
+        read_timeout=config.scraper.read_timeout,
+        max_connections=config.scraper.max_connections,
+        keepalive_expiry=config.scraper.keepalive_expiry,
+    ) as client, AddressParser() as address_parser:
+        normalizer = CachedNormalizer(
+            address_parser,
+            r,
+            prefix=config.storage.prefix,
+            ttl=config.parser.street_cache_ttl,
+            cache_size=config.parser.street_cache_size,
+            concurrency=config.parser.concurrency,
+        )
+        logger.info("Using address parser %s", normalizer.version)
+        metrics.track_cache(
+            "streets",
+            hits=lambda: normalizer.cache.hits,
+            misses=lambda: normalizer.cache.misses,
+            size=lambda: len(normalizer.cache),
+        )
+        metrics.track_cache(
+            "streets_redis",
+            hits=lambda: normalizer.redis_hits,
+            misses=lambda: normalizer.redis_misses,
+        )
+        outage_parser = OutageDetailsParser(
+            normalizer, concurrency=config.parser.concurrency
+        )
+        organization_parser = OrganizationParser()
+        host_limits = HostLimits(config.scraper.max_connections_per_host)
+        retry = RetryPolicy(
+            retries=config.scraper.retries,
+            backoff=config.scraper.retry_backoff,
+            budget=RetryBudget(ratio=config.scraper.retry_budget),
+        )
+
+        profilers = []
+        leases = []
+        for source in config.scraper.sources:
+            profiler = CycleProfiler(
+                os.path.join(config.profiling.directory, source.name or ""),
+                slow_cycle=config.profiling.slow_cycle,
+                sample_interval=config.profiling.sample_interval,
+                tracemalloc_frames=config.profiling.tracemalloc_frames,
+            )
+            if config.profiling.cycles:
+                profiler.profile_next(config.profiling.cycles)
+            profilers.append(profiler)
+
+            lease = queue = None
+            if config.coordination.enabled:
+                suffix = f":{source.name}" if source.name else ""
+                lease = LeaderLease(
+                    r,
+                    f"{config.storage.prefix}:leader{suffix}",
+                    config.coordination.replica_id,
+                    ttl=config.coordination.lease_ttl,
+                )
+                queue = WorkQueue(
+                    r,
+                    f"{config.storage.prefix}:work{suffix}",
+                    config.coordination.replica_id,
+                    maxlen=config.coordination.queue_maxlen,
+                    claim_idle=config.coordination.claim_idle,
+                )
+                await queue.setup()
+                leases.append(lease)
+                asyncio.create_task(lease.start())
+
+            task = PeriodicTask(
+                scraper=Scraper(
+                    source.url,
+                    storage=storage,
+                    metrics=metrics,
+                    source=source.name,
+                    client=client,
+                    host_limits=host_limits,
+                    encoding=source.encoding,
+                    retry=retry,
+                    total_timeout=config.scraper.total_timeout or None,
+                    max_size=config.scraper.max_response_size or None,
+                    executor=executor,
+                ),
+                storage=storage,
+                publisher=publisher,
+                outage_parser=outage_parser,
+                organization_parser=organization_parser,
+                interval=source.interval,
+                schedule=Schedule(
+                    source.interval,
+                    min_interval=config.scraper.min_interval,
+                    max_interval=config.scraper.max_interval,
+                    backoff=config.scraper.backoff,
+                    jitter=config.scraper.jitter,
+                    busy_hours=config.scraper.busy_hours,
+                ),
+                cache_size=config.parser.cache_size,
+                concurrency=config.parser.concurrency,
+                metrics=metrics,
+                profiler=profiler,
+                executor=executor,
+                lease=lease,
+                queue=queue,
+            )
+            asyncio.create_task(task.start())
+            logger.info("Started periodic task for %s", source.name or source.url)
+            if queue:
+                asyncio.create_task(ShardWorker(task, queue).start())
+                logger.info(
+                    "Started shard worker %s for %s",
+                    config.coordination.replica_id,
+                    source.name or source.url,
+                )
+
+        loop.add_signal_handler(
+            signal.SIGUSR1,
+            lambda: [
+                profiler.profile_next(config.profiling.signal_cycles)
+                for profiler in profilers
+            ],
         )
-        asyncio.create_task(task.start())
+        # Tracing is process-wide, any profiler toggles it for all of them
+        loop.add_signal_handler(signal.SIGUSR2, profilers[0].toggle_tracemalloc)
 
-        logger.info("Started periodic task")
+        janitor = Janitor(
+            storage,
+            interval=config.storage.cleanup_interval,
+            batch_size=config.storage.cleanup_batch_size,
+        )
+        asyncio.create_task(janitor.start())
 
         try:
             # Keep the main coroutine running
@@ -54,7 +224,20 @@ async def main():
         except asyncio.CancelledError:
             logger.info("Shutting down...")
         finally:
-            r.close()
+            # Another replica takes over right away instead of after the TTL
+            for lease in leases:
+                try:
+                    await lease.stop()
+                except Exception:
+                    logger.warning("Failed to release %s", lease.key, exc_info=True)
+            for profiler in profilers:
+                profiler.close()
+            if executor:
+                executor.shutdown()
+            if metrics_server:
+                await metrics_server.stop()
+            await r.aclose()
+            await pool.aclose()
             logger.info("Redis connection closed")
 
 
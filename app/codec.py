@@ -0,0 +1,284 @@
+"""
+Compact binary encoding of the records kept in Redis.
+
+Layout (version 1):
+
+    version, flags,
+    shape: byte length, then varints: resource type?, phones, streets,
+        buildings + 1 (0 for none) of every street, reason?,
+        water deliveries + 1 (0 for none), comments?, dates
+    strings: byte length, then the UTF-8 of the strings joined by `\\x1f`:
+        area, resource type, resource, organization, phones,
+        name and buildings of every street, reason type and description,
+        street, buildings, start and end of every water delivery, comments
+    compressed comments: byte length, then the zlib stream
+    dates: signed 64-bit little-endian seconds since the epoch
+
+The strings are encoded and split in one call each, so the cost doesn't grow
+with the number of fields the way per-field length prefixes do. Comments longer
+than `COMPRESS_THRESHOLD` bytes are stored zlib-compressed after the strings
+when that is shorter. A record with a separator inside a value is stored as
+JSON, which `decode_record` accepts as it did before.
+"""
+
+import hashlib
+import struct
+import zlib
+from datetime import datetime, timedelta
+from typing import TypeVar
+
+from apis.models import (
+    OrganizationInfo,
+    OutageDetails,
+    Reason,
+    ResourceType,
+    Street,
+    WaterDelivery,
+)
+from pydantic import BaseModel
+
+from app.publisher import ParsedRecord
+
+FORMAT_VERSION = 1
+COMPRESS_THRESHOLD = 256
+DIGEST_SIZE = 8
+
+_FLAG_COMPRESSED_COMMENTS = 1
+_EPOCH = datetime(1970, 1, 1)
+_SEPARATOR = "\x1f"
+_HEADER = struct.Struct("<BB")
+_RESOURCE_TYPES = {resource_type.value: resource_type for resource_type in ResourceType}
+
+_Model = TypeVar("_Model", bound=BaseModel)
+
+# Single-byte varints, the lengths of most strings and lists
+_SMALL = [bytes((value,)) for value in range(0x80)]
+
+
+def digest(*parts: str) -> bytes:
+    """64-bit digest of the joined parts, as raw bytes"""
+    return hashlib.blake2b(
+        "\x1f".join(parts).encode(), digest_size=DIGEST_SIZE
+    ).digest()
+
+
+def _varint(value: int) -> bytes:
+    if value < 0x80:
+        return _SMALL[value]
+    buffer = bytearray()
+    while value >= 0x80:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+    return bytes(buffer)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    """The varint at `pos` and the position after it"""
+    result = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _read_varints(data: bytes) -> list[int]:
+    if max(data, default=0) < 0x80:
+        return list(data)
+
+    values = []
+    pos = 0
+    while pos < len(data):
+        value, pos = _read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def _construct(cls, **fields):
+    """
+    Creates a pydantic dataclass without validating `fields`, the counterpart of
+    `BaseModel.model_construct`
+    """
+    instance = object.__new__(cls)
+    instance.__dict__.update(fields)
+    return instance
+
+
+def _construct_model(cls: type[_Model], **fields) -> _Model:
+    """
+    `BaseModel.model_construct` for models given every field, without its
+    lookup of aliases and defaults
+    """
+    instance = cls.__new__(cls)
+    object.__setattr__(instance, "__dict__", fields)
+    object.__setattr__(instance, "__pydantic_fields_set__", set(fields))
+    object.__setattr__(instance, "__pydantic_extra__", None)
+    object.__setattr__(instance, "__pydantic_private__", None)
+    return instance
+
+
+def encode_record(record: ParsedRecord) -> bytes:
+    organization = record.organization
+    details = record.details
+    shape: list[int] = []
+    strings = [record.area]
+
+    if organization.resource_type is not None:
+        shape.append(1)
+        strings.append(organization.resource_type.value)
+    else:
+        shape.append(0)
+    strings += (organization.resource, organization.organization)
+    shape.append(len(organization.phones))
+    strings += organization.phones
+
+    shape.append(len(details.streets))
+    for street in details.streets:
+        strings.append(street.name)
+        if street.buildings is None:
+            shape.append(0)
+        else:
+            shape.append(len(street.buildings) + 1)
+            strings += street.buildings
+
+    if details.reason is not None:
+        shape.append(1)
+        strings += (details.reason.type, details.reason.description)
+    else:
+        shape.append(0)
+
+    if details.water_deliveries is not None:
+        shape.append(len(details.water_deliveries) + 1)
+        for delivery in details.water_deliveries:
+            strings += (
+                delivery.street,
+                delivery.buildings,
+                delivery.time_start,
+                delivery.time_end,
+            )
+    else:
+        shape.append(0)
+
+    flags = 0
+    compressed = b""
+    shape.append(int(details.comments is not None))
+    if details.comments is not None:
+        comments = details.comments.encode()
+        if len(comments) > COMPRESS_THRESHOLD:
+            compressed = zlib.compress(comments)
+        if compressed and len(compressed) < len(comments):
+            flags |= _FLAG_COMPRESSED_COMMENTS
+            compressed = _varint(len(compressed)) + compressed
+        else:
+            compressed = b""
+            strings.append(details.comments)
+
+    shape.append(len(record.dates))
+
+    text = _SEPARATOR.join(strings)
+    if text.count(_SEPARATOR) != len(strings) - 1:
+        # A value contains the separator
+        return record.model_dump_json().encode()
+
+    encoded = text.encode()
+    encoded_shape = b"".join([_varint(value) for value in shape])
+    return b"".join(
+        (
+            _HEADER.pack(FORMAT_VERSION, flags),
+            _varint(len(encoded_shape)),
+            encoded_shape,
+            _varint(len(encoded)),
+            encoded,
+            compressed,
+            struct.pack(
+                f"<{len(record.dates)}q",
+                *[int((date - _EPOCH).total_seconds()) for date in record.dates],
+            ),
+        )
+    )
+
+
+def decode_record(raw: bytes | str) -> ParsedRecord:
+    """Decodes both the binary format and the JSON used before it"""
+    if isinstance(raw, str) or raw[:1] == b"{":
+        return ParsedRecord.model_validate_json(raw)
+
+    version, flags = _HEADER.unpack_from(raw)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unknown record format version {version}")
+
+    size, pos = _read_varint(raw, _HEADER.size)
+    count = iter(_read_varints(raw[pos : pos + size])).__next__
+    size, pos = _read_varint(raw, pos + size)
+    text = iter(raw[pos : pos + size].decode().split(_SEPARATOR)).__next__
+    pos += size
+
+    # The encoded data was validated when it was written, the models are
+    # constructed without validating it again
+    area = text()
+    organization = _construct_model(
+        OrganizationInfo,
+        resource_type=_RESOURCE_TYPES[text()] if count() else None,
+        resource=text(),
+        organization=text(),
+        phones=[text() for _ in range(count())],
+    )
+
+    streets = []
+    for _ in range(count()):
+        name = text()
+        buildings = count()
+        streets.append(
+            _construct(
+                Street,
+                name=name,
+                buildings=[text() for _ in range(buildings - 1)] if buildings else None,
+            )
+        )
+    reason = _construct(Reason, type=text(), description=text()) if count() else None
+    deliveries = count()
+    water_deliveries = (
+        [
+            _construct(
+                WaterDelivery,
+                street=text(),
+                buildings=text(),
+                time_start=text(),
+                time_end=text(),
+            )
+            for _ in range(deliveries - 1)
+        ]
+        if deliveries
+        else None
+    )
+
+    comments = None
+    if count():
+        if flags & _FLAG_COMPRESSED_COMMENTS:
+            size, pos = _read_varint(raw, pos)
+            comments = zlib.decompress(raw[pos : pos + size]).decode()
+            pos += size
+        else:
+            comments = text()
+
+    dates = [
+        _EPOCH + timedelta(0, seconds)
+        for seconds in struct.unpack_from(f"<{count()}q", raw, pos)
+    ]
+
+    return _construct_model(
+        ParsedRecord,
+        area=area,
+        organization=organization,
+        details=_construct_model(
+            OutageDetails,
+            streets=streets,
+            reason=reason,
+            water_deliveries=water_deliveries,
+            comments=comments,
+        ),
+        dates=dates,
+    )
@@ -1,54 +1,244 @@
 from dataclasses import dataclass
 import os
+import socket
 
 
 @dataclass
 class Redis:
     url: str
+    max_connections: int
+    pool_timeout: float
+    socket_timeout: float
+    socket_connect_timeout: float
+    health_check_interval: int
+
+
+@dataclass
+class Source:
+    # None for the default source, which keeps the unsuffixed validator keys
+    name: str | None
+    url: str
+    interval: int
+    encoding: str
 
 
 @dataclass
 class Scraper:
     url: str
     interval: int
+    min_interval: int
+    max_interval: int
+    backoff: float
+    jitter: float
+    busy_hours: list[tuple[int, int]]
+    sources: list[Source]
+    max_connections: int
+    max_connections_per_host: int
+    keepalive_expiry: float
+    connect_timeout: float
+    read_timeout: float
+    total_timeout: float
+    retries: int
+    retry_backoff: float
+    retry_budget: float
+    max_response_size: int
+
+
+@dataclass
+class Parser:
+    cache_size: int
+    concurrency: int
+    street_cache_size: int
+    street_cache_ttl: int
 
 
 @dataclass
 class Storage:
     ttl: int
     prefix: str
+    mirror: bool
+    legacy_v1: bool
+    cleanup_interval: int
+    cleanup_batch_size: int
 
 
 @dataclass
 class Publisher:
     prefix: str
+    modes: list[str]
+    stream_maxlen: int
+    stream_group: str | None
+
+
+@dataclass
+class Metrics:
+    host: str
+    port: int
+
+
+@dataclass
+class Profiling:
+    directory: str
+    cycles: int
+    signal_cycles: int
+    slow_cycle: float
+    sample_interval: float
+    tracemalloc_frames: int
+
+
+@dataclass
+class Executor:
+    workers: int
+
+
+@dataclass
+class Coordination:
+    enabled: bool
+    replica_id: str
+    lease_ttl: float
+    claim_idle: float
+    queue_maxlen: int
 
 
 @dataclass
 class Config:
     redis: Redis
     scraper: Scraper
+    parser: Parser
     storage: Storage
     publisher: Publisher
+    metrics: Metrics
+    profiling: Profiling
+    executor: Executor
+    coordination: Coordination
 
 
 config = Config(
     redis=Redis(
         url=os.environ.get("REDIS__URL", "redis://localhost:6379"),
+        max_connections=int(os.environ.get("REDIS__MAX_CONNECTIONS", 10)),
+        pool_timeout=float(os.environ.get("REDIS__POOL_TIMEOUT", 20)),
+        socket_timeout=float(os.environ.get("REDIS__SOCKET_TIMEOUT", 5)),
+        socket_connect_timeout=float(
+            os.environ.get("REDIS__SOCKET_CONNECT_TIMEOUT", 5)
+        ),
+        health_check_interval=int(os.environ.get("REDIS__HEALTH_CHECK_INTERVAL", 30)),
     ),
     scraper=Scraper(
         url=os.environ.get("SCRAPER__URL", "http://93.92.65.26/aspx/Gorod.htm"),
         interval=int(os.environ.get("SCRAPER__INTERVAL", 5 * 60)),
+        min_interval=int(os.environ.get("SCRAPER__MIN_INTERVAL", 0)),
+        max_interval=int(os.environ.get("SCRAPER__MAX_INTERVAL", 0)),
+        backoff=float(os.environ.get("SCRAPER__BACKOFF", 1.5)),
+        jitter=float(os.environ.get("SCRAPER__JITTER", 0.1)),
+        busy_hours=[
+            (int(start), int(end))
+            for start, end in (
+                hours.split("-", 1)
+                for hours in os.environ.get("SCRAPER__BUSY_HOURS", "").split(",")
+                if hours.strip()
+            )
+        ],
+        sources=[
+            Source(
+                name=None,
+                url=os.environ.get("SCRAPER__URL", "http://93.92.65.26/aspx/Gorod.htm"),
+                interval=int(os.environ.get("SCRAPER__INTERVAL", 5 * 60)),
+                encoding=os.environ.get("SCRAPER__ENCODING", "windows-1251"),
+            ),
+            *[
+                Source(
+                    name=name.lower(),
+                    url=os.environ[f"SCRAPER__{name.upper()}__URL"],
+                    interval=int(
+                        os.environ.get(
+                            f"SCRAPER__{name.upper()}__INTERVAL",
+                            os.environ.get("SCRAPER__INTERVAL", 5 * 60),
+                        )
+                    ),
+                    encoding=os.environ.get(
+                        f"SCRAPER__{name.upper()}__ENCODING",
+                        os.environ.get("SCRAPER__ENCODING", "windows-1251"),
+                    ),
+                )
+                for name in (
+                    name.strip()
+                    for name in os.environ.get("SCRAPER__SOURCES", "").split(",")
+                )
+                if name
+            ],
+        ],
+        max_connections=int(os.environ.get("SCRAPER__MAX_CONNECTIONS", 10)),
+        max_connections_per_host=int(
+            os.environ.get("SCRAPER__MAX_CONNECTIONS_PER_HOST", 2)
+        ),
+        keepalive_expiry=float(os.environ.get("SCRAPER__KEEPALIVE_EXPIRY", 30)),
+        connect_timeout=float(os.environ.get("SCRAPER__CONNECT_TIMEOUT", 5)),
+        read_timeout=float(os.environ.get("SCRAPER__READ_TIMEOUT", 30)),
+        total_timeout=float(os.environ.get("SCRAPER__TOTAL_TIMEOUT", 120)),
+        retries=int(os.environ.get("SCRAPER__RETRIES", 3)),
+        retry_backoff=float(os.environ.get("SCRAPER__RETRY_BACKOFF", 0.5)),
+        retry_budget=float(os.environ.get("SCRAPER__RETRY_BUDGET", 0.2)),
+        max_response_size=int(
+            os.environ.get("SCRAPER__MAX_RESPONSE_SIZE", 16 * 1024 * 1024)
+        ),
+    ),
+    parser=Parser(
+        cache_size=int(os.environ.get("PARSER__CACHE_SIZE", 2048)),
+        concurrency=int(os.environ.get("PARSER__CONCURRENCY", 8)),
+        street_cache_size=int(os.environ.get("PARSER__STREET_CACHE_SIZE", 8192)),
+        street_cache_ttl=int(os.environ.get("PARSER__STREET_CACHE_TTL_DAYS", 30))
+        * 24
+        * 60
+        * 60,
     ),
     storage=Storage(
         ttl=int(os.environ.get("STORAGE__TTL_DAYS", 5)) * 24 * 60 * 60,
         prefix=os.environ.get(
             "STORAGE__PREFIX", os.environ.get("REDIS__PREFIX", "bot-005")
         ),
+        mirror=os.environ.get("STORAGE__MIRROR", "false").lower()
+        in ("1", "true", "yes"),
+        legacy_v1=os.environ.get("STORAGE__LEGACY_V1", "true").lower()
+        in ("1", "true", "yes"),
+        cleanup_interval=int(os.environ.get("STORAGE__CLEANUP_INTERVAL", 60 * 60)),
+        cleanup_batch_size=int(os.environ.get("STORAGE__CLEANUP_BATCH_SIZE", 500)),
     ),
     publisher=Publisher(
         prefix=os.environ.get(
             "PUBLISHER__PREFIX", os.environ.get("REDIS__PREFIX", "bot-005")
-        )
+        ),
+        modes=[
+            mode.strip()
+            for mode in os.environ.get("PUBLISHER__MODES", "pubsub").split(",")
+            if mode.strip()
+        ],
+        stream_maxlen=int(os.environ.get("PUBLISHER__STREAM_MAXLEN", 10000)),
+        stream_group=os.environ.get("PUBLISHER__STREAM_GROUP") or None,
+    ),
+    metrics=Metrics(
+        host=os.environ.get("METRICS__HOST", "0.0.0.0"),
+        port=int(os.environ.get("METRICS__PORT", 0)),
+    ),
+    profiling=Profiling(
+        directory=os.environ.get("PROFILING__DIR", "/tmp/monitor-profiles"),
+        cycles=int(os.environ.get("PROFILING__CYCLES", 0)),
+        signal_cycles=int(os.environ.get("PROFILING__SIGNAL_CYCLES", 1)),
+        slow_cycle=float(os.environ.get("PROFILING__SLOW_CYCLE", 0)),
+        sample_interval=float(os.environ.get("PROFILING__SAMPLE_INTERVAL_MS", 5))
+        / 1000,
+        tracemalloc_frames=int(os.environ.get("PROFILING__TRACEMALLOC_FRAMES", 0)),
+    ),
+    executor=Executor(
+        workers=int(os.environ.get("EXECUTOR__WORKERS", 0)),
+    ),
+    coordination=Coordination(
+        enabled=os.environ.get("COORDINATION__ENABLED", "false").lower()
+        in ("1", "true", "yes"),
+        replica_id=os.environ.get("COORDINATION__REPLICA_ID")
+        or f"{socket.gethostname()}-{os.getpid()}",
+        lease_ttl=float(os.environ.get("COORDINATION__LEASE_TTL", 30)),
+        claim_idle=float(os.environ.get("COORDINATION__CLAIM_IDLE", 60)),
+        queue_maxlen=int(os.environ.get("COORDINATION__QUEUE_MAXLEN", 10000)),
     ),
 )
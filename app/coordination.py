@@ -0,0 +1,187 @@
+"""
+Coordination of several monitor replicas over Redis: a renewable leader lease
+for scraping, and a work queue of scraped areas shared by all replicas.
+"""
+
+import asyncio
+import logging
+import time
+
+from pydantic import TypeAdapter
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from app.scraper import Record
+
+logger = logging.getLogger(__name__)
+
+_RENEW = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+_records = TypeAdapter(list[Record])
+
+
+class LeaderLease:
+    """
+    Lease in `key` held by one replica at a time. The holder renews it every
+    third of `ttl`, another replica takes over once it expires.
+    """
+
+    def __init__(self, r: Redis, key: str, owner: str, ttl: float = 30.0):
+        self.r = r
+        self.key = key
+        self.owner = owner
+        self.ttl = ttl
+
+        self.is_running = False
+
+        # Monotonic time until which the lease is surely held, it ends before
+        # the key expires in Redis so two replicas never both consider themselves
+        # the leader
+        self._valid_until = 0.0
+        self._renew = r.register_script(_RENEW)
+        self._release = r.register_script(_RELEASE)
+
+    @property
+    def is_leader(self) -> bool:
+        return time.monotonic() < self._valid_until
+
+    async def acquire(self) -> bool:
+        """Acquires or renews the lease, returns whether it is held"""
+        started = time.monotonic()
+        ttl_ms = int(self.ttl * 1000)
+        was_leader = self.is_leader
+
+        try:
+            if was_leader:
+                held = bool(
+                    await self._renew(keys=[self.key], args=[self.owner, ttl_ms])
+                )
+            else:
+                held = bool(await self.r.set(self.key, self.owner, nx=True, px=ttl_ms))
+                if not held:
+                    # Still ours after a restart or a missed renewal
+                    held = bool(
+                        await self._renew(keys=[self.key], args=[self.owner, ttl_ms])
+                    )
+        except Exception:
+            logger.warning("Failed to renew the leader lease", exc_info=True)
+            held = False
+
+        # Measured from before the request, minus a margin for clock drift
+        self._valid_until = started + self.ttl * 0.9 if held else 0.0
+        if held != was_leader:
+            logger.info(
+                "%s the leader lease %s", "Acquired" if held else "Lost", self.key
+            )
+        return held
+
+    async def start(self):
+        self.is_running = True
+        while self.is_running:
+            await self.acquire()
+            await asyncio.sleep(self.ttl / 3)
+
+    async def stop(self):
+        self.is_running = False
+        if self.is_leader:
+            self._valid_until = 0.0
+            await self._release(keys=[self.key], args=[self.owner])
+
+
+class WorkQueue:
+    """
+    Stream of scraped records, one entry per area, read by the `workers`
+    consumer group. An entry is delivered to one replica and stays pending until
+    acknowledged, entries pending longer than `claim_idle` seconds, e.g. of a
+    replica that died, are claimed by another replica.
+    """
+
+    GROUP = "workers"
+
+    def __init__(
+        self,
+        r: Redis,
+        key: str,
+        consumer: str,
+        maxlen: int = 10000,
+        claim_idle: float = 60.0,
+    ):
+        self.r = r
+        self.key = key
+        self.consumer = consumer
+        self.maxlen = maxlen
+        self.claim_idle = claim_idle
+
+    async def setup(self):
+        try:
+            await self.r.xgroup_create(self.key, self.GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def put(self, records: list[Record]) -> int:
+        """Queues the records grouped by area, returns the number of entries"""
+        areas: dict[str, list[Record]] = {}
+        for record in records:
+            areas.setdefault(record.area, []).append(record)
+
+        async with self.r.pipeline(transaction=False) as pipe:
+            for area, area_records in areas.items():
+                pipe.xadd(
+                    self.key,
+                    {"area": area, "records": _records.dump_json(area_records)},
+                    maxlen=self.maxlen,
+                    approximate=True,
+                )
+            await pipe.execute()
+        return len(areas)
+
+    async def get(
+        self, count: int = 1, block: float = 1.0
+    ) -> list[tuple[str, list[Record]]]:
+        """
+        Returns `(entry id, records)` of stale entries first, then waits up to
+        `block` seconds for new ones. `block` must stay below the socket timeout.
+        """
+        _, entries, *_ = await self.r.xautoclaim(
+            self.key,
+            self.GROUP,
+            self.consumer,
+            min_idle_time=int(self.claim_idle * 1000),
+            count=count,
+        )
+        if entries:
+            logger.info("Claimed %d stale work entries", len(entries))
+        else:
+            response = await self.r.xreadgroup(
+                self.GROUP,
+                self.consumer,
+                {self.key: ">"},
+                count=count,
+                block=int(block * 1000),
+            )
+            entries = response[0][1] if response else []
+
+        return [
+            (entry_id, _records.validate_json(fields["records"]))
+            for entry_id, fields in entries
+            if fields
+        ]
+
+    async def ack(self, *entry_ids: str):
+        async with self.r.pipeline(transaction=False) as pipe:
+            pipe.xack(self.key, self.GROUP, *entry_ids)
+            pipe.xdel(self.key, *entry_ids)
+            await pipe.execute()
@@ -0,0 +1,89 @@
+"""
+Runs the CPU-bound stages (page extraction, outage details parsing, legacy
+similarity search) in worker processes, so the event loop keeps serving Redis,
+signals and the metrics endpoint meanwhile.
+
+Functions sent to the pool must be importable module-level functions or class
+methods, and their arguments and results must be picklable.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Sequence, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def _configure_logging(
+    level: int, format: str | None, datefmt: str | None, disabled: int
+):
+    logging.basicConfig(level=level, stream=sys.stdout, format=format, datefmt=datefmt)
+    logging.disable(disabled)
+
+
+def _apply(fn: Callable[..., R], items: Sequence[Any], args: tuple) -> list[R]:
+    return [fn(item, *args) for item in items]
+
+
+class Executor:
+    """
+    Process pool of `workers` processes. With no workers every call runs
+    inline on the calling thread, as before the pool existed.
+    """
+
+    def __init__(self, workers: int = 0):
+        self.workers = workers
+
+        self._pool: ProcessPoolExecutor | None = None
+        if workers > 0:
+            root = logging.getLogger()
+            formatter = root.handlers[0].formatter if root.handlers else None
+            # Spawned workers do not inherit the event loop or the threads, the
+            # logging is configured the same way as in the main process
+            self._pool = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_configure_logging,
+                initargs=(
+                    root.level,
+                    formatter._fmt if formatter else None,
+                    formatter.datefmt if formatter else None,
+                    logging.root.manager.disable,
+                ),
+            )
+            logger.info("Started %d worker processes", workers)
+
+    async def run(self, fn: Callable[..., R], *args: Any) -> R:
+        if self._pool is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def map(
+        self, fn: Callable[..., R], items: Sequence[T], *args: Any
+    ) -> list[R]:
+        """
+        Returns `[fn(item, *args) for item in items]`, the items are split into
+        one chunk per worker so large batches use every core.
+        """
+        if self._pool is None or len(items) < 2:
+            return _apply(fn, items, args)
+
+        size = -(-len(items) // self.workers)
+        chunks = await asyncio.gather(
+            *[
+                self.run(_apply, fn, items[i : i + size], args)
+                for i in range(0, len(items), size)
+            ]
+        )
+        return [result for chunk in chunks for result in chunk]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,270 @@
+"""
+Prometheus metrics of the monitor, served in the text exposition format by a
+small built-in HTTP listener.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator
+
+if TYPE_CHECKING:
+    from redis.asyncio import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: tuple[str, str] | None = None) -> str:
+    pairs = [*labels, extra] if extra else list(labels)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callback when the metrics are scraped"""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._callbacks: dict[Labels, Callable[[], float]] = {}
+
+    def set_function(self, callback: Callable[[], float], **labels: str):
+        self._callbacks[tuple(sorted(labels.items()))] = callback
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, callback in self._callbacks.items():
+            try:
+                value = callback()
+            except Exception:
+                logger.warning("Failed to read gauge %s", self.name, exc_info=True)
+                continue
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # labels -> (bucket counts, sum, count)
+        self._values: dict[Labels, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels: str) -> int:
+        return self._values.get(tuple(sorted(labels.items())), ([], 0.0, 0))[2]
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                le = ("le", _format_value(bound))
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Metrics:
+    """Metrics of the scrape cycle, shared by the scraper, storage and task"""
+
+    def __init__(self):
+        self.stage_duration = Histogram(
+            "monitor_stage_duration_seconds",
+            "Duration of the periodic task stages",
+        )
+        self.records = Counter(
+            "monitor_records_total",
+            "Records by processing outcome",
+        )
+        self.cycles = Counter(
+            "monitor_cycles_total",
+            "Periodic task cycles by result",
+        )
+        self.redis_commands = Counter(
+            "monitor_redis_commands_total",
+            "Redis commands sent, including the ones in pipelines",
+        )
+        self.cache_hit_rate = Gauge(
+            "monitor_cache_hit_rate",
+            "Hit rate of the in-process caches since the start",
+        )
+        self.cache_entries = Gauge(
+            "monitor_cache_entries",
+            "Entries in the in-process caches",
+        )
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        with self.stage_duration.time(stage=stage):
+            yield
+
+    def track_cache(
+        self,
+        cache: str,
+        hits: Callable[[], int],
+        misses: Callable[[], int],
+        size: Callable[[], int] | None = None,
+    ):
+        def hit_rate() -> float:
+            total = hits() + misses()
+            return hits() / total if total else 0.0
+
+        self.cache_hit_rate.set_function(hit_rate, cache=cache)
+        if size is not None:
+            self.cache_entries.set_function(size, cache=cache)
+
+    def instrument_redis(self, pool: "ConnectionPool"):
+        """Counts the commands sent over the connections of `pool`"""
+        counter = self.redis_commands
+        base = pool.connection_class
+
+        class CountingConnection(base):  # type: ignore[valid-type,misc]
+            def pack_command(self, *args):
+                if args:
+                    name = args[0]
+                    if isinstance(name, bytes):
+                        name = name.decode()
+                    counter.inc(command=str(name).split(" ", 1)[0].upper())
+                return super().pack_command(*args)
+
+        CountingConnection.__name__ = f"Counting{base.__name__}"
+        pool.connection_class = CountingConnection
+
+    def expose(self) -> str:
+        lines: list[str] = []
+        for metric in (
+            self.stage_duration,
+            self.records,
+            self.cycles,
+            self.redis_commands,
+            self.cache_hit_rate,
+            self.cache_entries,
+        ):
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves `GET /metrics` on a plain HTTP/1.0 listener"""
+
+    def __init__(self, metrics: Metrics, host: str, port: int):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+
+        self._server: asyncio.Server | None = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            method, path, *_ = request.split(b"\r\n", 1)[0].decode("latin-1").split()
+
+            if method != "GET":
+                status, body = "405 Method Not Allowed", b""
+            elif path.split("?", 1)[0] != "/metrics":
+                status, body = "404 Not Found", b""
+            else:
+                status, body = "200 OK", self.metrics.expose().encode()
+
+            writer.write(
+                (
+                    f"HTTP/1.0 {status}\r\n"
+                    "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode()
+                + body
+            )
+            await writer.drain()
+        except (
+            asyncio.IncompleteReadError,
+            asyncio.TimeoutError,
+            ConnectionError,
+            ValueError,
+        ):
+            pass
+        finally:
+            writer.close()
@@ -1,8 +1,12 @@
+from .normalizer import CachedNormalizer, StreetMatch
 from .organization import OrganizationInfo, OrganizationParser, ResourceType
 from .outage_details import OutageDetails, OutageDetailsParser
+from .table import TableRowExtractor
 from .utils import format_dates, parse_dates
 
 __all__ = [
+    "CachedNormalizer",
+    "StreetMatch",
     "parse_dates",
     "format_dates",
     "OutageDetailsParser",
@@ -10,4 +14,5 @@ __all__ = [
     "OrganizationInfo",
     "OrganizationParser",
     "ResourceType",
+    "TableRowExtractor",
 ]
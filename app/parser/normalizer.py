@@ -0,0 +1,158 @@
+import asyncio
+import json
+import logging
+import typing
+from dataclasses import dataclass
+from importlib import metadata
+
+from app.cache import LRUCache
+
+if typing.TYPE_CHECKING:
+    from address_parser import AddressParser
+    from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class StreetMatch:
+    name: str
+    confidence: float
+
+
+def address_parser_version() -> str:
+    try:
+        return metadata.version("address-parser")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class CachedNormalizer:
+    """
+    Street name normalizer backed by an in-process LRU and a Redis hash.
+
+    Both accepted and rejected matches are cached. The Redis hash is keyed by the
+    address parser version, so an upgrade starts from an empty table and the old
+    entries expire with their TTL.
+    """
+
+    def __init__(
+        self,
+        address_parser: "AddressParser",
+        r: "Redis",
+        prefix: str,
+        ttl: int,
+        cache_size: int,
+        concurrency: int = 8,
+        version: str | None = None,
+    ):
+        self.address_parser = address_parser
+        self.r = r
+        self.ttl = ttl
+
+        self.version = version or address_parser_version()
+        self.key_streets = f"{prefix}:streets:{self.version}"
+
+        self.cache: LRUCache[str, StreetMatch | None] = LRUCache(cache_size)
+        self.redis_hits = 0
+        self.redis_misses = 0
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def normalize(self, street_name: str) -> StreetMatch | None:
+        return (await self.normalize_many([street_name]))[street_name]
+
+    async def normalize_many(
+        self, street_names: list[str]
+    ) -> dict[str, StreetMatch | None]:
+        """
+        Normalize a batch of street names: one Redis round trip for the names
+        missing in process and one more to store the names parsed from scratch.
+        """
+        result: dict[str, StreetMatch | None] = {}
+        missing: list[str] = []
+        for street_name in dict.fromkeys(street_names):
+            match = self.cache.get(street_name, _MISSING)
+            if match is _MISSING:
+                missing.append(street_name)
+            else:
+                result[street_name] = match  # type: ignore
+
+        if not missing:
+            return result
+
+        loaded = await self._load(missing)
+        unresolved = [name for name in missing if name not in loaded]
+        self.redis_hits += len(loaded)
+        self.redis_misses += len(unresolved)
+
+        parsed = dict(
+            zip(
+                unresolved,
+                await asyncio.gather(*[self._parse(name) for name in unresolved]),
+            )
+        )
+        await self._store(parsed)
+
+        for street_name in missing:
+            match = loaded.get(street_name, parsed.get(street_name))
+            self.cache.put(street_name, match)
+            result[street_name] = match
+
+        return result
+
+    async def _parse(self, street_name: str) -> StreetMatch | None:
+        async with self._semaphore:
+            return self._to_match(await self.address_parser.normalize(street_name))
+
+    async def _load(self, street_names: list[str]) -> dict[str, StreetMatch | None]:
+        try:
+            values = await self.r.hmget(self.key_streets, street_names)
+        except Exception:
+            logger.warning("Failed to load cached streets", exc_info=True)
+            return {}
+
+        return {
+            street_name: self._decode(raw)
+            for street_name, raw in zip(street_names, values)
+            if raw is not None
+        }
+
+    async def _store(self, matches: dict[str, StreetMatch | None]):
+        if not matches:
+            return
+
+        try:
+            async with self.r.pipeline(transaction=False) as pipe:
+                pipe.hset(
+                    self.key_streets,
+                    mapping={
+                        street_name: self._encode(match)
+                        for street_name, match in matches.items()
+                    },
+                )
+                pipe.hexpire(self.key_streets, self.ttl, *matches.keys())
+                await pipe.execute()
+        except Exception:
+            logger.warning("Failed to cache %d streets", len(matches), exc_info=True)
+
+    @staticmethod
+    def _to_match(match) -> StreetMatch | None:
+        if match is None:
+            return None
+        return StreetMatch(name=match.name, confidence=match.confidence)
+
+    @staticmethod
+    def _encode(match: StreetMatch | None) -> str:
+        if match is None:
+            return "null"
+        return json.dumps([match.name, match.confidence], ensure_ascii=False)
+
+    @staticmethod
+    def _decode(raw: str | bytes) -> StreetMatch | None:
+        value = json.loads(raw)
+        if value is None:
+            return None
+        return StreetMatch(name=value[0], confidence=value[1])
@@ -1,22 +1,61 @@
+import asyncio
 import logging
 import re
 import typing
+from collections import ChainMap
+from typing import Iterable, Mapping
 
 from apis.models import OutageDetails, Reason, Street, WaterDelivery
 
 if typing.TYPE_CHECKING:
     from address_parser import AddressParser
 
+    from app.parser.normalizer import CachedNormalizer, StreetMatch
+
 logger = logging.getLogger(__name__)
 
 
 class OutageDetailsParser:
-    def __init__(self, address_parser: "AddressParser"):
+    def __init__(
+        self,
+        address_parser: "AddressParser | CachedNormalizer",
+        concurrency: int = 8,
+    ):
         self.address_parser = address_parser
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def parse(
+        self, input: str, resolved: "dict[str, StreetMatch | None] | None" = None
+    ) -> OutageDetails | None:
+        """
+        Main method to parse all components of the input.
+
+        Street names found in `resolved` (see `resolve`) are not normalized again.
+        """
+        lines = self._split_lines(input)
+
+        if not lines:
+            return None
+
+        streets = []
+        while (
+            lines
+            and "е - " not in lines[0]
+            and (chunk := await self._parse_streets(lines.pop(0), resolved))
+        ):
+            streets.extend(chunk)
 
-    async def parse(self, input: str) -> OutageDetails | None:
-        """Main method to parse all components of the input"""
-        lines = [line.strip() for line in input.strip().split("\n") if line.strip()]
+        return self._details(input, lines, streets)
+
+    @classmethod
+    def parse_resolved(
+        cls, input: str, resolved: "dict[str, StreetMatch | None]"
+    ) -> OutageDetails | None:
+        """
+        `parse` of an input whose street names were all normalized in `resolved`.
+        It does no I/O, so it can run in a worker process.
+        """
+        lines = cls._split_lines(input)
 
         if not lines:
             return None
@@ -25,17 +64,24 @@ class OutageDetailsParser:
         while (
             lines
             and "е - " not in lines[0]
-            and (chunk := await self._parse_streets(lines.pop(0)))
+            and (chunk := cls._resolved_streets(lines.pop(0), resolved))
         ):
             streets.extend(chunk)
 
+        return cls._details(input, lines, streets)
+
+    @classmethod
+    def _details(
+        cls, input: str, lines: list[str], streets: list[Street]
+    ) -> OutageDetails:
+        """Parse the lines after the streets"""
         reason = None
         water_deliveries = None
         comments = None
         if len(lines) > 0:
-            reason = self._parse_reason(lines[0])
+            reason = cls._parse_reason(lines[0])
         if len(lines) > 1:
-            water_deliveries = self._parse_water_deliveries(lines[1])
+            water_deliveries = cls._parse_water_deliveries(lines[1])
             comments = "\n".join(lines[1:])
 
         if not streets:
@@ -48,19 +94,69 @@ class OutageDetailsParser:
             comments=comments,
         )
 
-    async def _parse_streets(self, address_line: str) -> list[Street]:
+    def street_names(self, input: str) -> set[str]:
+        """Collect the street names `parse` would normalize, without normalizing"""
+        lines = self._split_lines(input)
+
+        names: set[str] = set()
+        while (
+            lines
+            and "е - " not in lines[0]
+            and (parts := self._split_street_parts(lines.pop(0)))
+        ):
+            names.update(street_name for street_name, _ in parts)
+
+        return names
+
+    async def resolve(
+        self, street_names: Iterable[str]
+    ) -> "dict[str, StreetMatch | None]":
+        """Normalize unique street names in one batch"""
+        unique = list(dict.fromkeys(street_names))
+        if not unique:
+            return {}
+
+        if normalize_many := getattr(self.address_parser, "normalize_many", None):
+            return await normalize_many(unique)
+
+        matches = await asyncio.gather(*[self._normalize(name) for name in unique])
+        return dict(zip(unique, matches))
+
+    async def _parse_streets(
+        self,
+        address_line: str,
+        resolved: "dict[str, StreetMatch | None] | None" = None,
+    ) -> list[Street]:
         """Parse street addresses from the first line"""
-        streets: list[Street] = []
-        for street_part in address_line.split(";"):
-            street_part = street_part.strip()
-            if not street_part:
-                continue
+        parts = self._split_street_parts(address_line)
 
-            street_name, numbers_str = self._split_street_and_numbers(street_part)
-            if not street_name:
-                continue
+        resolved = resolved or {}
+        pending = list(dict.fromkeys(name for name, _ in parts if name not in resolved))
+        matches = await asyncio.gather(*[self._normalize(name) for name in pending])
+
+        return self._build_streets(
+            address_line, parts, ChainMap(dict(zip(pending, matches)), resolved)
+        )
+
+    @classmethod
+    def _resolved_streets(
+        cls, address_line: str, resolved: "Mapping[str, StreetMatch | None]"
+    ) -> list[Street]:
+        return cls._build_streets(
+            address_line, cls._split_street_parts(address_line), resolved
+        )
+
+    @classmethod
+    def _build_streets(
+        cls,
+        address_line: str,
+        parts: list[tuple[str, str | None]],
+        matches: "Mapping[str, StreetMatch | None]",
+    ) -> list[Street]:
+        streets: list[Street] = []
+        for street_name, numbers_str in parts:
+            match_name = matches.get(street_name)
 
-            match_name = await self.address_parser.normalize(street_name)
             if not match_name or match_name.confidence < 0.6:
                 logger.warning(
                     "Rejected street match: '%s' (confidence: %.2f)",
@@ -70,7 +166,7 @@ class OutageDetailsParser:
             else:
                 street_name = match_name.name
 
-            buildings = self._process_building_numbers(numbers_str)
+            buildings = cls._process_building_numbers(numbers_str)
 
             streets.append(Street(name=street_name, buildings=buildings or None))
 
@@ -79,6 +175,31 @@ class OutageDetailsParser:
 
         return streets
 
+    async def _normalize(self, street_name: str):
+        async with self._semaphore:
+            return await self.address_parser.normalize(street_name)
+
+    @staticmethod
+    def _split_lines(input: str) -> list[str]:
+        return [line.strip() for line in input.strip().split("\n") if line.strip()]
+
+    @classmethod
+    def _split_street_parts(cls, address_line: str) -> list[tuple[str, str | None]]:
+        """Split an address line into street names and building numbers"""
+        parts: list[tuple[str, str | None]] = []
+        for street_part in address_line.split(";"):
+            street_part = street_part.strip()
+            if not street_part:
+                continue
+
+            street_name, numbers_str = cls._split_street_and_numbers(street_part)
+            if not street_name:
+                continue
+
+            parts.append((street_name, numbers_str))
+
+        return parts
+
     @staticmethod
     def _split_street_and_numbers(
         street_part: str,
@@ -122,7 +243,8 @@ class OutageDetailsParser:
         reason_type, description = line.split("-", 1)
         return Reason(type=reason_type.strip(), description=description.strip())
 
-    def _parse_water_deliveries(self, line: str) -> list[WaterDelivery] | None:
+    @staticmethod
+    def _parse_water_deliveries(line: str) -> list[WaterDelivery] | None:
         """Parse water delivery information"""
         if not line.startswith("Подвоз воды: "):
             return None
@@ -0,0 +1,201 @@
+import codecs
+import logging
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+_WS_RE = re.compile(r"\s+")
+
+_VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+
+Row = tuple[str, str, str, str]
+
+
+def collapse_whitespaces(string: str) -> str:
+    return _WS_RE.sub(" ", string)
+
+
+def normalize_multiline(string: str) -> str:
+    return "\n".join([s.strip() for s in string.splitlines()])
+
+
+@dataclass(eq=False)
+class _Cell:
+    # Concatenated raw strings, as `Tag.text`
+    text: list[str] = field(default_factory=list)
+    # Whitespace-collapsed strings with `<br>` as newlines
+    lines: list[str] = field(default_factory=list)
+
+
+@dataclass(eq=False)
+class _Row:
+    text: list[str] = field(default_factory=list)
+    cells: list[_Cell] = field(default_factory=list)
+    closed: bool = False
+
+
+class TableRowExtractor(HTMLParser):
+    """
+    Incremental extractor of outage rows from the first table of the page.
+
+    Bytes are fed as they arrive and complete rows are returned as
+    `(area, organization, address, dates)` tuples. Rows are interpreted the same
+    way as a `html.parser` tree would be: an end tag closes every element opened
+    after the matching start tag, unmatched end tags are ignored and `<br>` is
+    rendered as a line break.
+    """
+
+    def __init__(self, encoding: str = "windows-1251"):
+        super().__init__(convert_charrefs=True)
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+
+        self._stack: list[tuple[str, object | None]] = []
+        self._data: list[str] = []
+        self._table_depth: int | None = None
+        self._done = False
+
+        self._rows: deque[_Row] = deque()
+        self._open_rows: list[_Row] = []
+        self._open_cells: list[_Cell] = []
+
+        self.area: str | None = None
+
+    def feed_bytes(self, chunk: bytes) -> list[Row]:
+        self.feed(self._decoder.decode(chunk))
+        return self._drain()
+
+    def close(self) -> list[Row]:  # type: ignore[override]
+        self.feed(self._decoder.decode(b"", final=True))
+        super().close()
+        self._flush()
+        while self._stack:
+            self._pop()
+        return self._drain()
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if self._done:
+            return
+
+        if tag in _VOID_ELEMENTS:
+            if tag == "br":
+                for cell in self._open_cells:
+                    cell.lines.append("\n")
+            return
+
+        element: object | None = None
+        if self._table_depth is None:
+            if tag == "table":
+                self._table_depth = len(self._stack)
+        elif tag == "tr":
+            element = _Row()
+            self._rows.append(element)
+            self._open_rows.append(element)
+        elif tag == "td" and self._open_rows:
+            element = _Cell()
+            for row in self._open_rows:
+                row.cells.append(element)
+            self._open_cells.append(element)
+
+        self._stack.append((tag, element))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                while len(self._stack) > i:
+                    self._pop()
+                return
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def _flush(self):
+        if not self._data:
+            return
+
+        data = "".join(self._data)
+        self._data.clear()
+        if self._table_depth is None or self._done:
+            return
+
+        collapsed = collapse_whitespaces(data)
+        for cell in self._open_cells:
+            cell.text.append(data)
+            cell.lines.append(collapsed)
+        for row in self._open_rows:
+            row.text.append(data)
+
+    def _pop(self):
+        _, element = self._stack.pop()
+        if isinstance(element, _Row):
+            element.closed = True
+            self._open_rows.remove(element)
+        elif isinstance(element, _Cell):
+            self._open_cells.remove(element)
+
+        if self._table_depth is not None and len(self._stack) == self._table_depth:
+            self._done = True
+
+    def _drain(self) -> list[Row]:
+        result = []
+        while self._rows and self._rows[0].closed:
+            if row := self._process_row(self._rows.popleft()):
+                result.append(row)
+        return result
+
+    def _process_row(self, row: _Row) -> Row | None:
+        text = "".join(row.text).strip()
+        if not text:
+            return None
+
+        cells = ["".join(cell.text) for cell in row.cells]
+        if len(cells) != 3:
+            logger.debug("Skipping row: %s", text)
+            return None
+
+        if not cells[0].strip() and "район" in cells[1] and not cells[2].strip():
+            self.area = collapse_whitespaces(cells[1])
+            return None
+
+        if not self.area:
+            return None
+
+        if not all(cell.strip() for cell in cells):
+            logger.debug("Skipping row: %s", "|".join(cell.strip() for cell in cells))
+            return None
+
+        organization, address, _ = ["".join(cell.lines) for cell in row.cells]
+
+        return (
+            self.area,
+            normalize_multiline(organization),
+            normalize_multiline(address),
+            collapse_whitespaces(cells[2].strip()),
+        )
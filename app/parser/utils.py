@@ -1,35 +1,72 @@
-from contextlib import contextmanager
 from datetime import datetime
-import locale
 import re
 
-LOCALE_RUSSIAN = "ru_RU.UTF-8"
-DATE_PATTERN = r"(\d{1,2})\s+(\w+)\s+(\d{2})[-:](\d{2})"
+DATE_PATTERN = re.compile(r"(\d{1,2})\s+(\w+)\s+(\d{2})[-:](\d{2})")
 
+MONTHS_GENITIVE = (
+    "января",
+    "февраля",
+    "марта",
+    "апреля",
+    "мая",
+    "июня",
+    "июля",
+    "августа",
+    "сентября",
+    "октября",
+    "ноября",
+    "декабря",
+)
+MONTHS_NOMINATIVE = (
+    "январь",
+    "февраль",
+    "март",
+    "апрель",
+    "май",
+    "июнь",
+    "июль",
+    "август",
+    "сентябрь",
+    "октябрь",
+    "ноябрь",
+    "декабрь",
+)
 
-@contextmanager
-def setlocale(name):
-    saved = locale.setlocale(locale.LC_ALL)
+_MONTHS = {
+    name: number
+    for names in (MONTHS_GENITIVE, MONTHS_NOMINATIVE)
+    for number, name in enumerate(names, start=1)
+}
+
+
+def _month(name: str) -> int:
     try:
-        yield locale.setlocale(locale.LC_ALL, name)
-    finally:
-        locale.setlocale(locale.LC_ALL, saved)
+        return _MONTHS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown month name: {name}") from None
 
 
 def parse_dates(dates: str) -> list[datetime]:
     current_year = datetime.now().year
-    found = re.findall(DATE_PATTERN, dates)
-
-    with setlocale(LOCALE_RUSSIAN):
-        return [
-            datetime.strptime(
-                f"{day} {month} {current_year} {hour.replace('24', '23')}:{minutes if hour != '24' else '59'}",
-                "%d %B %Y %H:%M",
-            )
-            for day, month, hour, minutes in found
-        ]
+
+    # "24-00" is the end of the day, it is kept within the same day as 23:59
+    return [
+        datetime(
+            current_year,
+            _month(month),
+            int(day),
+            23 if hour == "24" else int(hour),
+            59 if hour == "24" else int(minutes),
+        )
+        for day, month, hour, minutes in DATE_PATTERN.findall(dates)
+    ]
 
 
 def format_dates(dates: list[datetime]) -> str:
-    with setlocale(LOCALE_RUSSIAN):
-        return " ".join([date.strftime("%d %B %H-%M").lower() for date in dates])
+    return " ".join(
+        [
+            f"{date.day:02d} {MONTHS_GENITIVE[date.month - 1]} "
+            f"{date.hour:02d}-{date.minute:02d}"
+            for date in dates
+        ]
+    )
@@ -0,0 +1,229 @@
+"""
+Opt-in profiling of the periodic task cycles:
+
+* deterministic `cProfile` of the next N cycles, saved as `.prof` files;
+* a sampling profiler running during every cycle whose stacks are saved in the
+  collapsed flame graph format when the cycle is slower than a threshold;
+* `tracemalloc` snapshots compared between cycles to show memory growth.
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of one thread while a cycle is active"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+
+        self.stacks: Counter[str] = Counter()
+        self._active = threading.Event()
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.stacks = Counter()
+        self._active.set()
+
+    def end(self) -> Counter[str]:
+        self._active.clear()
+        with self._lock:
+            return self.stacks
+
+    def stop(self):
+        self._stopped = True
+        self._active.set()
+
+    def run(self):
+        while not self._stopped:
+            self._active.wait()
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None and self._active.is_set():
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                        f":{frame.f_lineno})"
+                    )
+                    frame = frame.f_back
+                with self._lock:
+                    self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+
+class CycleProfiler:
+    """
+    Wraps every cycle of the periodic task, see `cycle()`. Nothing is recorded
+    until one of the captures is enabled.
+    """
+
+    # Whether a cycle of any profiler is under cProfile
+    _profiling = False
+    # Incremented whenever tracemalloc starts, the snapshots taken before are
+    # not compared with the new ones
+    _tracing_generation = 0
+
+    def __init__(
+        self,
+        directory: str,
+        slow_cycle: float = 0,
+        sample_interval: float = 0.005,
+        tracemalloc_frames: int = 0,
+        top: int = 15,
+    ):
+        self.directory = directory
+        self.slow_cycle = slow_cycle
+        self.sample_interval = sample_interval
+        self.tracemalloc_frames = tracemalloc_frames
+        self.top = top
+
+        self._profile_cycles = 0
+        self._sampler: StackSampler | None = None
+        self._snapshot: tracemalloc.Snapshot | None = None
+        self._snapshot_generation = 0
+
+        # Tracing is process-wide, started once for all the profilers
+        if tracemalloc_frames and not tracemalloc.is_tracing():
+            self.toggle_tracemalloc()
+
+    def profile_next(self, cycles: int):
+        """Profiles the next `cycles` cycles with cProfile"""
+        self._profile_cycles = cycles
+        logger.info("Profiling the next %d cycles", cycles)
+
+    def toggle_tracemalloc(self):
+        """Starts or stops tracing for every profiler in the process"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("Stopped tracing memory allocations")
+        else:
+            tracemalloc.start(self.tracemalloc_frames or 1)
+            CycleProfiler._tracing_generation += 1
+            logger.info("Tracing memory allocations")
+
+    def close(self):
+        if self._sampler:
+            self._sampler.stop()
+            self._sampler = None
+
+    @contextmanager
+    def cycle(self) -> Iterator[None]:
+        """Profiles the wrapped cycle with the enabled captures"""
+        profile = None
+        if self._profile_cycles > 0:
+            if CycleProfiler._profiling:
+                # Only one cProfile profiler can be active in the process, the
+                # cycle of another source is being profiled
+                logger.info("Another cycle is being profiled, postponing the profile")
+            else:
+                self._profile_cycles -= 1
+                profile = cProfile.Profile()
+
+        sampler = self._start_sampler() if self.slow_cycle > 0 else None
+        start = time.perf_counter()
+        if profile:
+            CycleProfiler._profiling = True
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+                CycleProfiler._profiling = False
+            duration = time.perf_counter() - start
+            stacks = sampler.end() if sampler else None
+
+            try:
+                if profile:
+                    self._save_profile(profile, duration)
+                if stacks is not None and duration > self.slow_cycle:
+                    self._save_stacks(stacks, duration)
+                if tracemalloc.is_tracing():
+                    self._compare_snapshots()
+            except OSError:
+                logger.warning("Failed to save the cycle profile", exc_info=True)
+
+    def _start_sampler(self) -> StackSampler:
+        if self._sampler is None:
+            self._sampler = StackSampler(threading.get_ident(), self.sample_interval)
+            self._sampler.start()
+        self._sampler.begin()
+        return self._sampler
+
+    def _path(self, kind: str, extension: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        return os.path.join(self.directory, f"{kind}-{timestamp}.{extension}")
+
+    def _save_profile(self, profile: cProfile.Profile, duration: float):
+        path = self._path("cycle", "prof")
+        profile.dump_stats(path)
+
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(
+            self.top
+        )
+        logger.info(
+            "Cycle took %.2fs, profile saved to %s\n%s",
+            duration,
+            path,
+            summary.getvalue(),
+        )
+
+    def _save_stacks(self, stacks: Counter[str], duration: float):
+        path = self._path("slow", "collapsed")
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        leaves: Counter[str] = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        logger.warning(
+            "Slow cycle: %.2fs, %d samples saved to %s, top frames:\n%s",
+            duration,
+            total,
+            path,
+            "\n".join(
+                f"{count / total:6.1%} {frame}"
+                for frame, count in leaves.most_common(self.top)
+            ),
+        )
+
+    def _compare_snapshots(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        previous, self._snapshot = self._snapshot, snapshot
+        if self._snapshot_generation != CycleProfiler._tracing_generation:
+            # The first snapshot since tracing started
+            self._snapshot_generation = CycleProfiler._tracing_generation
+            return
+
+        current, peak = tracemalloc.get_traced_memory()
+        growth = snapshot.compare_to(previous, "lineno")[: self.top]
+        logger.info(
+            "Traced memory %.1f MiB (peak %.1f MiB), growth since the last cycle:\n%s",
+            current / 2**20,
+            peak / 2**20,
+            "\n".join(str(stat) for stat in growth),
+        )
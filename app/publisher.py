@@ -1,3 +1,4 @@
+import hashlib
 import logging
 from datetime import datetime
 from functools import cached_property
@@ -6,9 +7,12 @@ from typing import TYPE_CHECKING
 from apis.pubsub_models import Outage
 from apis.models import OrganizationInfo, OutageDetails
 from pydantic import BaseModel
+from redis.exceptions import ResponseError
+
+from app.cache import LRUCache
 
 if TYPE_CHECKING:
-    from redis import Redis
+    from redis.asyncio import Redis
 
     from app.scraper import Record
 
@@ -26,21 +30,241 @@ class ParsedRecord(BaseModel):
         return "\n".join([str(s) for s in self.details.streets])
 
 
+MODE_PUBSUB = "pubsub"
+MODE_STREAM = "stream"
+
+# Values of the idempotency keys
+_CLAIM_PENDING = "pending"
+_CLAIM_SENT = "sent"
+
+
 class Publisher:
-    def __init__(self, redis: "Redis", prefix: str):
+    """
+    Publishes outages to the `{prefix}:outages` PubSub channel and/or appends them
+    to the `{prefix}:outages:stream` stream. Stream consumers can use consumer
+    groups to read missed messages in batches, the stream is trimmed to about
+    `stream_maxlen` entries.
+
+    With `idempotency_ttl` every message first claims a `{prefix}:published:*`
+    key derived from its content, so a message processed again, e.g. by another
+    replica after a failover, is not sent twice within the TTL. The claim is
+    pending for `claim_ttl` seconds and kept for `idempotency_ttl` once the
+    message is sent. A message claimed by another replica but not sent yet is
+    not published, and can be claimed again if that replica dies before sending.
+    `claim_ttl` must be shorter than the time after which the work of a dead
+    replica is taken over, and longer than sending takes.
+    """
+
+    def __init__(
+        self,
+        redis: "Redis",
+        prefix: str,
+        modes: list[str] | None = None,
+        stream_maxlen: int = 10000,
+        stream_group: str | None = None,
+        idempotency_ttl: int | None = None,
+        claim_ttl: float = 30.0,
+    ):
         self.channel = f"{prefix}:outages"
+        self.stream = f"{prefix}:outages:stream"
+        self.key_published = f"{prefix}:published"
         self.redis = redis
 
-    async def publish(self, outage: ParsedRecord):
-        msg = Outage(
+        self.modes = list(dict.fromkeys(modes or [MODE_PUBSUB]))
+        unknown = set(self.modes) - {MODE_PUBSUB, MODE_STREAM}
+        if unknown:
+            raise ValueError(f"Unknown publisher modes: {', '.join(sorted(unknown))}")
+
+        self.stream_maxlen = stream_maxlen
+        self.stream_group = stream_group
+        self.idempotency_ttl = idempotency_ttl
+        self.claim_ttl = claim_ttl
+
+        # Modes a message was already delivered to when another mode failed, only
+        # the failed modes are sent again, so stream consumers see no duplicates
+        self._delivered: LRUCache[str, frozenset[str]] = LRUCache(1024)
+
+    async def setup(self):
+        """
+        Creates the consumer group, if configured, so that messages published
+        before the first consumer connects are not lost.
+        """
+        if MODE_STREAM not in self.modes or not self.stream_group:
+            return
+
+        try:
+            await self.redis.xgroup_create(
+                self.stream, self.stream_group, id="0", mkstream=True
+            )
+            logger.info("Created consumer group %s", self.stream_group)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def publish(self, outage: ParsedRecord) -> bool:
+        return (await self.publish_many([outage]))[0]
+
+    async def publish_many(self, outages: list[ParsedRecord]) -> list[bool]:
+        """
+        Publishes outages in a single pipelined round trip. An outage counts as
+        published only if every configured mode succeeded, a retry of a failed
+        outage is sent only to the modes that failed.
+
+        Returns:
+            list[bool]: Whether each outage was published, in the input order.
+        """
+        if not outages:
+            return []
+
+        messages = [self._serialize(outage) for outage in outages]
+
+        # The claims held before, messages already sent count as published
+        claims: list[str | None] = [None] * len(messages)
+        if self.idempotency_ttl:
+            try:
+                claims = await self._claim(messages)
+            except Exception:
+                logger.exception("Failed to claim %d outages", len(outages))
+                return [False] * len(outages)
+
+            skipped = claims.count(_CLAIM_SENT)
+            if skipped:
+                logger.info("Skipping %d outages published before", skipped)
+            busy = claims.count(_CLAIM_PENDING)
+            if busy:
+                logger.info("%d outages are being published by another replica", busy)
+            if None not in claims:
+                return [claim == _CLAIM_SENT for claim in claims]
+
+        claimed = [claim is None for claim in claims]
+
+        pending = [
+            (
+                [
+                    mode
+                    for mode in self.modes
+                    if mode not in self._delivered.get(msg, ())
+                ]
+                if is_claimed
+                else []
+            )
+            for msg, is_claimed in zip(messages, claimed)
+        ]
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for msg, modes in zip(messages, pending):
+                    for mode in modes:
+                        if mode == MODE_PUBSUB:
+                            pipe.publish(self.channel, msg)
+                        else:
+                            pipe.xadd(
+                                self.stream,
+                                {"outage": msg},
+                                maxlen=self.stream_maxlen,
+                                approximate=True,
+                            )
+                results = await pipe.execute(raise_on_error=False)
+        except Exception:
+            logger.exception("Failed to publish %d outages", len(outages))
+            await self._release(
+                [msg for msg, is_claimed in zip(messages, claimed) if is_claimed]
+            )
+            return [False] * len(outages)
+
+        published = []
+        failed = []
+        i = 0
+        for msg, claim, modes in zip(messages, claims, pending):
+            if claim is not None:
+                published.append(claim == _CLAIM_SENT)
+                continue
+
+            replies = results[i : i + len(modes)]
+            i += len(modes)
+            errors = [reply for reply in replies if isinstance(reply, Exception)]
+            if errors:
+                logger.error("Failed to publish outage: %s (%s)", msg, errors[0])
+                delivered = {
+                    mode
+                    for mode, reply in zip(modes, replies)
+                    if not isinstance(reply, Exception)
+                }
+                if delivered:
+                    self._delivered.put(
+                        msg, self._delivered.get(msg, frozenset()) | delivered
+                    )
+                published.append(False)
+                failed.append(msg)
+            else:
+                logger.info("Published outage: %s", msg)
+                self._delivered.pop(msg)
+                published.append(True)
+
+        await self._release(failed)
+        await self._confirm(
+            [
+                msg
+                for msg, is_claimed, ok in zip(messages, claimed, published)
+                if is_claimed and ok
+            ]
+        )
+        return published
+
+    def _key(self, message: str) -> str:
+        digest = hashlib.blake2b(message.encode(), digest_size=16).hexdigest()
+        return f"{self.key_published}:{digest}"
+
+    async def _claim(self, messages: list[str]) -> list[str | None]:
+        """
+        Sets the idempotency keys of the messages as pending for `claim_ttl`.
+
+        Returns:
+            list[str | None]: None for each message claimed, the value of the key
+            set before otherwise.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for msg in messages:
+                pipe.set(
+                    self._key(msg),
+                    _CLAIM_PENDING,
+                    nx=True,
+                    px=int(self.claim_ttl * 1000),
+                    get=True,
+                )
+            return [
+                claim.decode() if isinstance(claim, bytes) else claim
+                for claim in await pipe.execute()
+            ]
+
+    async def _confirm(self, messages: list[str]):
+        """Marks the messages sent for `idempotency_ttl`"""
+        if not messages or not self.idempotency_ttl:
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for msg in messages:
+                    pipe.set(self._key(msg), _CLAIM_SENT, ex=self.idempotency_ttl)
+                await pipe.execute()
+        except Exception:
+            # Sent already, at worst sent again once the claims expire
+            logger.exception("Failed to confirm %d outages", len(messages))
+
+    async def _release(self, messages: list[str]):
+        """Removes the idempotency keys of messages that failed to publish"""
+        if not self.idempotency_ttl or not messages:
+            return
+        try:
+            await self.redis.delete(*[self._key(msg) for msg in messages])
+        except Exception:
+            logger.exception("Failed to release %d outages", len(messages))
+
+    @staticmethod
+    def _serialize(outage: ParsedRecord) -> str:
+        return Outage(
             area=outage.area,
             organization_info=outage.organization,
             details=outage.details,
             period=outage.dates,
         ).model_dump_json()
-
-        try:
-            self.redis.publish(self.channel, msg)
-            logger.info("Published outage: %s", msg)
-        except Exception:
-            logger.exception("Failed to publish outage")
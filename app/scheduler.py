@@ -1,13 +1,26 @@
 import asyncio
 import logging
+import random
+import time
+from contextlib import nullcontext
 from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable
 
+from app.cache import LRUCache
+from app.metrics import Metrics
 from app.publisher import ParsedRecord
 from app.scraper import Record
 
 if TYPE_CHECKING:
-    from app.parser import OutageDetailsParser, OrganizationParser
+    from app.coordination import LeaderLease, WorkQueue
+    from app.executor import Executor
+    from app.parser import (
+        OutageDetails,
+        OutageDetailsParser,
+        OrganizationParser,
+        StreetMatch,
+    )
+    from app.profiling import CycleProfiler
     from app.publisher import Publisher
     from app.scraper import Scraper
     from app.storage import Storage
@@ -15,6 +28,61 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+class Schedule:
+    """
+    Monotonic deadlines of the periodic task, so the period does not drift by
+    the cycle time. The interval drops to `min_interval` after the page changes
+    and during `busy_hours` (local [start, end) hour ranges), grows by `backoff`
+    up to `max_interval` while the page stays the same, and every deadline is
+    shifted by up to `jitter` of the interval.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        min_interval: float | None = None,
+        max_interval: float | None = None,
+        backoff: float = 1.5,
+        jitter: float = 0.0,
+        busy_hours: list[tuple[int, int]] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        self.min_interval = min(interval, min_interval or interval)
+        self.max_interval = max(interval, max_interval or interval)
+        self.backoff = backoff
+        self.jitter = jitter
+        self.busy_hours = busy_hours or []
+
+        self.interval = float(interval)
+
+        self._clock = clock
+        self._now = now
+        self._base = clock()
+
+    def reset(self):
+        self._base = self._clock()
+
+    def is_busy(self) -> bool:
+        hour = self._now().hour
+        return any(start <= hour < end for start, end in self.busy_hours)
+
+    def advance(self, changed: bool) -> float:
+        """Moves to the next deadline and returns the delay until it"""
+        if changed or self.is_busy():
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+        now = self._clock()
+        # The deadlines missed by a long cycle are skipped, not caught up
+        self._base = max(self._base + self.interval, now)
+        deadline = self._base + self.interval * random.uniform(
+            -self.jitter, self.jitter
+        )
+        return max(deadline - now, 0.0)
+
+
 class PeriodicTask:
     def __init__(
         self,
@@ -24,6 +92,14 @@ class PeriodicTask:
         outage_parser: "OutageDetailsParser",
         organization_parser: "OrganizationParser",
         interval: int,
+        cache_size: int = 2048,
+        concurrency: int = 8,
+        metrics: Metrics | None = None,
+        profiler: "CycleProfiler | None" = None,
+        schedule: Schedule | None = None,
+        executor: "Executor | None" = None,
+        lease: "LeaderLease | None" = None,
+        queue: "WorkQueue | None" = None,
     ):
         self.scraper = scraper
         self.storage = storage
@@ -32,14 +108,43 @@ class PeriodicTask:
         self.organization_parser = organization_parser
 
         self.interval = interval
+        self.schedule = schedule or Schedule(interval)
+        self.executor = executor
+        # With several replicas only the lease holder scrapes, and the records
+        # are processed from the queue by `ShardWorker` on every replica
+        self.lease = lease
+        self.queue = queue
+
+        # Parsed records keyed by the raw row fingerprint, shared between cycles
+        self.parsed_cache: LRUCache[bytes, ParsedRecord] = LRUCache(cache_size)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self.metrics = metrics or Metrics()
+        self.metrics.track_cache(
+            (
+                "parsed_records"
+                if scraper.source is None
+                else f"parsed_records_{scraper.source}"
+            ),
+            hits=lambda: self.parsed_cache.hits,
+            misses=lambda: self.parsed_cache.misses,
+            size=lambda: len(self.parsed_cache),
+        )
+
+        self.profiler = profiler
 
         self.is_running = False
 
     async def start(self):
         self.is_running = True
+        self.schedule.reset()
         while self.is_running:
             await self.run()
-            await asyncio.sleep(self.interval)
+            delay = self.schedule.advance(self.scraper.changed)
+            logger.info(
+                "Next run in %.1fs, interval %.1fs", delay, self.schedule.interval
+            )
+            await asyncio.sleep(delay)
 
     async def stop(self):
         self.is_running = False
@@ -47,52 +152,184 @@ class PeriodicTask:
     async def run(self):
         logger.info("Running periodic task...")
 
+        profile = self.profiler.cycle() if self.profiler else nullcontext()
+        with self.metrics.stage("cycle"), profile:
+            result = await self._run()
+        self.metrics.cycles.inc(result=result)
+
+    async def _run(self) -> str:
+        if self.lease and not self.lease.is_leader:
+            logger.info("Not the leader, skipping scraping")
+            return "standby"
+
         try:
             records = await self.scraper.run()
             logger.info("Got %d records", len(records))
+            if not records:
+                return "unchanged"
 
+            now = datetime.now()
+            scraped = len(records)
             records = [
-                r
-                for r in [
-                    await self._fill_details(record)
-                    for record in records
-                    if not all(d < datetime.now() for d in record.dates)
-                ]
-                if r is not None
+                record for record in records if not all(d < now for d in record.dates)
             ]
+            self.metrics.records.inc(scraped - len(records), outcome="filtered")
             logger.info("After date filter %d records", len(records))
 
+            if self.queue:
+                # The leader lost the lease while scraping, the new one will queue
+                if self.lease and not self.lease.is_leader:
+                    return "standby"
+                with self.metrics.stage("enqueue"):
+                    entries = await self.queue.put(records)
+                logger.info("Queued %d records in %d areas", len(records), entries)
+                return "ok"
+        except Exception as e:
+            logger.error("Failed to scrape records: %s", e, exc_info=True)
+            return "error"
+
+        return await self.process(records)
+
+    async def process(self, records: list["Record"]) -> str:
+        """
+        Parses the scraped records, then publishes and commits the changes.
+        Returns "partial" if some outages were not published, e.g. were claimed
+        by another replica, so they are published on the next cycle.
+        """
+        try:
+            parsed = len(records)
+            with self.metrics.stage("resolve_streets"):
+                resolved = await self._resolve_streets(records)
+
+            with self.metrics.stage("fill_details"):
+                details = await self._parse_details(records, resolved)
+                records = [
+                    r
+                    for r in await asyncio.gather(
+                        *[
+                            self._fill_details(record, resolved, details)
+                            for record in records
+                        ]
+                    )
+                    if r is not None
+                ]
+            self.metrics.records.inc(parsed - len(records), outcome="filtered")
+            logger.info("Parsed %d records", len(records))
+            logger.info(
+                "Parsed records cache: %d hits, %d misses, %d entries",
+                self.parsed_cache.hits,
+                self.parsed_cache.misses,
+                len(self.parsed_cache),
+            )
+
             changes = await self.storage.diff(records)
             logger.info("Total changed %d records", len(changes))
+            self.metrics.records.inc(len(changes), outcome="changed")
             if not changes:
-                return
+                return "ok"
 
             logger.info("Changes:")
             for record in changes:
                 logger.info(record)
 
-            for record in changes:
-                try:
-                    await self.publisher.publish(record)
-                except Exception as e:
-                    logger.error("Failed to publish outage: %s", e, exc_info=True)
-                    records.remove(record)
+            with self.metrics.stage("publish"):
+                published = await self.publisher.publish_many(changes)
+            failed = [record for record, ok in zip(changes, published) if not ok]
+            self.metrics.records.inc(len(changes) - len(failed), outcome="published")
+            if failed:
+                logger.error("Failed to publish %d outages", len(failed))
+                self.metrics.records.inc(len(failed), outcome="failed")
+                # Left out of the commit, so they are published on the next cycle.
+                # Matched by fingerprint, the diff may return other objects
+                retry = {self.storage.fingerprint(record) for record in failed}
+                records = [
+                    record
+                    for record in records
+                    if self.storage.fingerprint(record) not in retry
+                ]
 
-            await self.storage.commit(records)
+            with self.metrics.stage("commit"):
+                await self.storage.commit(records)
         except Exception as e:
             logger.error("Failed to commit records: %s", e, exc_info=True)
+            return "error"
+
+        return "partial" if failed else "ok"
+
+    async def _resolve_streets(
+        self, records: list["Record"]
+    ) -> "dict[str, StreetMatch | None] | None":
+        """
+        Normalize the street names of all records missing in the parsed records
+        cache at once, so every unique street is resolved a single time per cycle.
+        Returns None if the batch failed.
+        """
+        street_names: set[str] = set()
+        for record in records:
+            if record.fingerprint() not in self.parsed_cache:
+                street_names |= self.outage_parser.street_names(record.address)
+
+        try:
+            resolved = await self.outage_parser.resolve(street_names)
+        except Exception:
+            logger.warning("Failed to resolve streets in batch", exc_info=True)
+            return None
+
+        logger.info("Resolved %d unique streets", len(resolved))
+        return resolved
+
+    async def _parse_details(
+        self,
+        records: list["Record"],
+        resolved: "dict[str, StreetMatch | None] | None",
+    ) -> "dict[bytes, OutageDetails | None]":
+        """
+        Parse the details of the records missing in the cache in the worker
+        processes, keyed by the record fingerprint. Nothing is parsed without an
+        executor, or if the streets were not resolved in batch.
+        """
+        if self.executor is None or resolved is None:
+            return {}
+
+        pending = {
+            fingerprint: record.address
+            for record in records
+            if (fingerprint := record.fingerprint()) not in self.parsed_cache
+        }
+        try:
+            details = await self.executor.map(
+                self.outage_parser.parse_resolved, list(pending.values()), resolved
+            )
+        except Exception:
+            logger.warning("Failed to parse details in workers", exc_info=True)
+            return {}
+
+        return dict(zip(pending.keys(), details))
+
+    async def _fill_details(
+        self,
+        record: "Record",
+        resolved: "dict[str, StreetMatch | None] | None" = None,
+        parsed_details: "dict[bytes, OutageDetails | None] | None" = None,
+    ) -> ParsedRecord | None:
+        fingerprint = record.fingerprint()
+        if parsed := self.parsed_cache.get(fingerprint):
+            return parsed
 
-    async def _fill_details(self, record: "Record") -> ParsedRecord | None:
         try:
             organization = self.organization_parser.parse(record.organization)
             if not organization:
                 raise ValueError("Failed to parse organization")
 
-            details = await self.outage_parser.parse(record.address)
+            if parsed_details and fingerprint in parsed_details:
+                details = parsed_details[fingerprint]
+            else:
+                async with self._semaphore:
+                    details = await self.outage_parser.parse(record.address, resolved)
             if not details:
                 raise ValueError("Failed to parse details")
 
-            return ParsedRecord(
+            parsed = ParsedRecord(
                 area=record.area,
                 organization=organization,
                 details=details,
@@ -101,3 +338,73 @@ class PeriodicTask:
         except Exception:
             logger.warning("Failed to parse record: %s", str(record), exc_info=True)
             return None
+
+        self.parsed_cache.put(fingerprint, parsed)
+        return parsed
+
+
+class ShardWorker:
+    """Processes the areas queued by the leader, runs on every replica"""
+
+    # Delay after a failed read of the queue
+    RETRY_DELAY = 5
+
+    def __init__(self, task: PeriodicTask, queue: "WorkQueue"):
+        self.task = task
+        self.queue = queue
+
+        self.is_running = False
+
+    async def start(self):
+        self.is_running = True
+        while self.is_running:
+            await self.run()
+
+    async def stop(self):
+        self.is_running = False
+
+    async def run(self):
+        try:
+            entries = await self.queue.get()
+        except Exception as e:
+            logger.error("Failed to read the work queue: %s", e, exc_info=True)
+            await asyncio.sleep(self.RETRY_DELAY)
+            return
+
+        for entry_id, records in entries:
+            logger.info("Processing %d queued records", len(records))
+            profiler = self.task.profiler
+            with profiler.cycle() if profiler else nullcontext():
+                result = await self.task.process(records)
+            self.task.metrics.cycles.inc(result=f"shard_{result}")
+
+            # An entry not fully published stays pending and is claimed again
+            # after a while, the outages committed before are not sent again
+            if result == "ok":
+                await self.queue.ack(entry_id)
+
+
+class Janitor:
+    """Periodically removes outdated records outside of the change cycle"""
+
+    def __init__(self, storage: "Storage", interval: int, batch_size: int = 500):
+        self.storage = storage
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self.is_running = False
+
+    async def start(self):
+        self.is_running = True
+        while self.is_running:
+            await self.run()
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        self.is_running = False
+
+    async def run(self):
+        try:
+            await self.storage.cleanup(self.batch_size)
+        except Exception as e:
+            logger.error("Failed to clean up storage: %s", e, exc_info=True)
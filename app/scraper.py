@@ -1,22 +1,27 @@
+import asyncio
+import hashlib
 import logging
-import re
-from dataclasses import dataclass
+from contextlib import asynccontextmanager, nullcontext
 from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, AsyncIterator
 
 import httpx
-from bs4 import BeautifulSoup
-from bs4.element import Tag, NavigableString
 from pydantic import BaseModel
 
-from app.parser import parse_dates
+from app.metrics import Metrics
+from app.parser import TableRowExtractor, parse_dates
+from app.parser.table import Row
+from app.transport import RetryPolicy, create_client, iter_limited
 
 if TYPE_CHECKING:
+    from app.executor import Executor
     from app.storage import Storage
 
 logger = logging.getLogger(__name__)
 
-_WS_RE = re.compile(r"\s+")
+# Body digests are stored in place of the ETag when the server does not send one,
+# the prefix keeps them out of If-None-Match.
+DIGEST_PREFIX = "sha256:"
 
 
 class Record(BaseModel):
@@ -28,122 +33,202 @@ class Record(BaseModel):
     def __repr__(self):
         return f"Record({self.area}, {self.organization}, {self.address}, {self.dates})"
 
+    def fingerprint(self) -> bytes:
+        """Digest of the raw row content, stable across scraping cycles"""
+        return hashlib.blake2b(
+            "\x1f".join(
+                [
+                    self.area,
+                    self.organization,
+                    self.address,
+                    *[d.isoformat() for d in self.dates],
+                ]
+            ).encode(),
+            digest_size=16,
+        ).digest()
 
-@dataclass
-class State:
-    area: str | None
+
+class HostLimits:
+    """Caps the concurrent requests to every host over a shared HTTP client"""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def __call__(self, url: str) -> asyncio.Semaphore:
+        host = httpx.URL(url).host
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self._semaphores[host]
 
 
 class Scraper:
-    def __init__(self, url: str, storage: "Storage"):
+    """
+    Scrapes the outage table of one source. Several scrapers can share one
+    `client`, the validators of a named `source` are stored under its own keys.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        storage: "Storage",
+        transport: httpx.AsyncBaseTransport | None = None,
+        metrics: Metrics | None = None,
+        source: str | None = None,
+        client: httpx.AsyncClient | None = None,
+        host_limits: HostLimits | None = None,
+        encoding: str = "windows-1251",
+        retry: RetryPolicy | None = None,
+        total_timeout: float | None = None,
+        max_size: int | None = None,
+        executor: "Executor | None" = None,
+    ):
         self.url = url
         self.storage = storage
-
-        self._session: httpx.AsyncClient | None = None
+        self.transport = transport
+        self.metrics = metrics or Metrics()
+        self.source = source
+        self.host_limits = host_limits
+        self.encoding = encoding
+        self.retry = retry
+        # Bounds the whole run: the retries, the download and the parsing
+        self.total_timeout = total_timeout
+        self.max_size = max_size
+        # Extracts whole pages in a worker process instead of while streaming
+        self.executor = executor
+
+        # Whether the last run found a new version of the page
+        self.changed = False
+
+        # A shared client is opened and closed by its owner
+        self._session: httpx.AsyncClient | None = client
+        self._owns_session = client is None
 
     async def __aenter__(self):
-        self._session = await httpx.AsyncClient().__aenter__()
+        if self._owns_session:
+            self._session = await create_client(transport=self.transport).__aenter__()
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
-        if self._session:
+        if self._session and self._owns_session:
             await self._session.__aexit__(exc_type, exc_value, traceback)
 
     async def run(self) -> list[Record]:
         if not self._session:
             raise RuntimeError("HTTP client is not initialized")
 
-        logger.info("Running scraper...")
-
-        if not await self.is_changed():
-            logger.info("ETag not changed, skipping scraping...")
-            return []
-
-        logger.info("ETag changed, scraping...")
-        response = await self._session.get(self.url)  # httpx.get(self.url)
-        response.encoding = "windows-1251"
-
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, "html.parser")
-        table: Tag = soup.find("table")  # type: ignore
-        state: State = State(area=None)
-
-        # Print all rows with numbers
-        records = []
-        for row in table.find_all("tr"):
-            text = row.text.strip()
-            if not text:
-                continue
-
-            cells = row.find_all("td")
-            if len(cells) != 3:
-                logger.debug("Skipping row: %s", text)
-                continue
-
-            if (
-                not cells[0].text.strip()
-                and "район" in cells[1].text
-                and not cells[2].text.strip()
-            ):
-                state.area = self.collapse_whitespaces(cells[1].text)
-                continue
-
-            if state.area:
-                records.append(self.process_area(state.area, cells))
-
-        records = list(filter(lambda x: x, records))
-
+        logger.info("Running scraper %s...", self.source or self.url)
+        self.changed = False
+
+        if self.total_timeout:
+            return await asyncio.wait_for(self._run(), self.total_timeout)
+        return await self._run()
+
+    async def _run(self) -> list[Record]:
+        headers = await self._conditional_headers()
+        async with self._stream(headers) as response:
+            if response.status_code == httpx.codes.NOT_MODIFIED:
+                logger.info("Page not modified, skipping scraping...")
+                return []
+
+            response.raise_for_status()
+
+            body = None
+            if "ETag" not in response.headers:
+                body = b"".join([c async for c in self._body(response)])
+
+            if not await self.is_changed(response, body):
+                logger.info("ETag not changed, skipping scraping...")
+                return []
+
+            logger.info("ETag changed, scraping...")
+            self.changed = True
+            if self.executor:
+                if body is None:
+                    body = b"".join([c async for c in self._body(response)])
+                with self.metrics.stage("html_parse"):
+                    records = await self.executor.run(parse_page, body, self.encoding)
+            else:
+                # Download and parsing overlap, the body is parsed as it arrives
+                with self.metrics.stage("html_parse"):
+                    extractor = TableRowExtractor(encoding=self.encoding)
+                    rows = []
+                    chunks = self._body(response) if body is None else _once(body)
+                    async for chunk in chunks:
+                        rows.extend(extractor.feed_bytes(chunk))
+                    rows.extend(extractor.close())
+                    records = _records(rows)
+
+        self.metrics.records.inc(len(records), outcome="scraped")
         return records
 
-    async def is_changed(self) -> bool:
-        if not self._session:
-            raise RuntimeError("HTTP client is not initialized")
+    @asynccontextmanager
+    async def _stream(self, headers: dict[str, str]) -> AsyncIterator[httpx.Response]:
+        """Opens a streaming GET, the time to the response headers is measured"""
+        assert self._session is not None
+
+        async with self.host_limits(self.url) if self.host_limits else nullcontext():
+            request = self._session.build_request("GET", self.url, headers=headers)
+            with self.metrics.stage("http_get"):
+                if self.retry:
+                    response = await self.retry.send(self._session, request)
+                else:
+                    response = await self._session.send(request, stream=True)
+            try:
+                yield response
+            finally:
+                await response.aclose()
+
+    def _body(self, response: httpx.Response) -> AsyncIterator[bytes]:
+        return iter_limited(response, self.max_size)
+
+    async def is_changed(
+        self, response: httpx.Response, body: bytes | None = None
+    ) -> bool:
+        if "Last-Modified" in response.headers:
+            await self.storage.set_last_modified(
+                response.headers["Last-Modified"], self.source
+            )
 
-        response = await self._session.head(self.url)
-        response.raise_for_status()
         if "ETag" not in response.headers:
-            logger.warning("ETag not found, scraping anyway.")
-            return True
+            logger.warning("ETag not found, comparing body digest.")
+            if body is None:
+                body = await response.aread()
+            digest = hashlib.sha256(body).hexdigest()
+            return await self.storage.is_etag_changed(
+                DIGEST_PREFIX + digest, self.source
+            )
 
-        return await self.storage.is_etag_changed(response.headers["ETag"])
+        return await self.storage.is_etag_changed(response.headers["ETag"], self.source)
 
-    def process_area(self, area: str, cells: tuple[Tag, Tag, Tag]) -> Record | None:
-        if not all(cell.text.strip() for cell in cells):
-            logger.debug(
-                "Skipping row: %s", "|".join(cell.text.strip() for cell in cells)
-            )
-            return None
+    async def _conditional_headers(self) -> dict[str, str]:
+        etag, last_modified = await self.storage.get_validators(self.source)
+
+        headers = {}
+        if etag and not etag.startswith(DIGEST_PREFIX):
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
 
-        organization = self.get_text(cells[0])
-        address = self.get_text(cells[1])
-        dates = self.collapse_whitespaces(cells[2].text.strip())
 
-        parsed_dates = parse_dates(dates)
+def parse_page(body: bytes, encoding: str) -> list[Record]:
+    """Extracts the records of a whole page, runs in the worker processes"""
+    extractor = TableRowExtractor(encoding=encoding)
+    return _records(extractor.feed_bytes(body) + extractor.close())
 
-        return Record(
+
+def _records(rows: list[Row]) -> list[Record]:
+    return [
+        Record(
             area=area,
-            organization=self._normalize_multiline(organization),
-            address=self._normalize_multiline(address),
-            dates=parsed_dates,
+            organization=organization,
+            address=address,
+            dates=parse_dates(dates),
         )
+        for area, organization, address, dates in rows
+    ]
+
 
-    @classmethod
-    def _normalize_multiline(cls, string):
-        return "\n".join([s.strip() for s in string.splitlines()])
-
-    @classmethod
-    def collapse_whitespaces(cls, string):
-        return _WS_RE.sub(" ", string)
-
-    @classmethod
-    def get_text(cls, tag: Tag) -> str:
-        def _get_text(tag: Tag):
-            for child in tag.children:
-                # print(child)
-                if isinstance(child, NavigableString):
-                    yield cls.collapse_whitespaces(child.get_text())
-                elif isinstance(child, Tag):
-                    yield from ["\n"] if child.name == "br" else _get_text(child)
-
-        return "".join(_get_text(tag))
+async def _once(body: bytes) -> AsyncIterator[bytes]:
+    yield body
@@ -0,0 +1,105 @@
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def _ngrams(string: str, n: int) -> frozenset[str]:
+    return frozenset(string[i : i + n] for i in range(len(string) - n + 1))
+
+
+class SimilarityIndex(Generic[T]):
+    """
+    Index of stored addresses answering "is there a stored address in the same
+    bucket with `SequenceMatcher.ratio()` above the threshold".
+
+    Entries are bucketed by an exact key (the last outage date) and by address
+    length. Lengths outside of the range allowed by `real_quick_ratio` are never
+    looked at, the remaining candidates are ordered by shared character n-grams
+    so that likely matches are compared first, and `quick_ratio` is checked
+    before the exact ratio. None of these steps drop a candidate that could pass
+    the threshold, so the result is the same as comparing against every entry.
+    """
+
+    def __init__(self, threshold: float = 0.8, ngram: int = 3):
+        self.threshold = threshold
+        self.ngram = ngram
+
+        self._buckets: dict[
+            Hashable, dict[int, list[tuple[str, frozenset[str], T]]]
+        ] = defaultdict(lambda: defaultdict(list))
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, address: str, key: Hashable, item: T):
+        self._buckets[key][len(address)].append(
+            (address, _ngrams(address, self.ngram), item)
+        )
+        self._size += 1
+
+    def find(self, address: str, key: Hashable) -> tuple[T, float] | None:
+        """
+        Returns the first stored item similar to `address` and its ratio,
+        or None if there is no such item.
+        """
+        bucket = self._buckets.get(key)
+        if not bucket:
+            return None
+
+        lo, hi = self._length_range(len(address))
+        candidates = [
+            entry
+            for length, entries in bucket.items()
+            if lo <= length <= hi
+            for entry in entries
+        ]
+        if not candidates:
+            return None
+
+        grams = _ngrams(address, self.ngram)
+        candidates.sort(key=lambda entry: len(grams & entry[1]), reverse=True)
+
+        s = SequenceMatcher()
+        s.set_seq2(address)
+        for stored_address, _, item in candidates:
+            s.set_seq1(stored_address)
+            if s.real_quick_ratio() <= self.threshold:
+                continue
+            if s.quick_ratio() <= self.threshold:
+                continue
+
+            ratio = s.ratio()
+            if ratio > self.threshold:
+                return item, ratio
+
+        return None
+
+    def _length_range(self, length: int) -> tuple[float, float]:
+        """
+        Lengths of stored addresses that can have a ratio above the threshold:
+        ratio <= 2 * min(a, b) / (a + b).
+        """
+        if self.threshold <= 0:
+            return 0, float("inf")
+
+        factor = self.threshold / (2 - self.threshold)
+        # Widened by one to stay on the safe side of float rounding
+        return length * factor - 1, length / factor + 1
+
+
+def find_similar(
+    stored: list[tuple[str, Hashable]],
+    queries: list[tuple[str, Hashable]],
+    threshold: float = 0.8,
+) -> list[tuple[int, float] | None]:
+    """
+    Indexes the `(address, key)` pairs of `stored` and finds the match of every
+    query as `(index in stored, ratio)`, so the search can run in a worker process.
+    """
+    index: SimilarityIndex[int] = SimilarityIndex(threshold=threshold)
+    for i, (address, key) in enumerate(stored):
+        index.add(address, key, i)
+    return [index.find(address, key) for address, key in queries]
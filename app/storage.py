@@ -1,20 +1,34 @@
-import asyncio
 import hashlib
 import logging
 import re
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from difflib import SequenceMatcher
-from typing import Awaitable, Literal, TypeVar
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Iterable, Literal
 
 from pydantic import BaseModel
-from redis import Redis
+from redis.asyncio import Redis
+from redis.client import NEVER_DECODE
 
+from app.codec import decode_record, digest, encode_record
+from app.metrics import Metrics
 from app.parser import format_dates
 from app.publisher import ParsedRecord
+from app.similarity import find_similar
+
+if TYPE_CHECKING:
+    from app.executor import Executor
 
 logger = logging.getLogger(__name__)
 
-T = TypeVar("T")
+_MIRROR_BATCH_SIZE = 1000
+
+# Schema versions:
+#   1 - `items`, `ttls` and `records` with similarity matching, plus `records_v2`
+#   2 - `records_v2` only
+#   3 - `records_v3`: 64-bit binary digests and compact values, see app.codec
+SCHEMA_VERSION = 3
 
 
 class _Record(BaseModel):
@@ -24,34 +38,196 @@ class _Record(BaseModel):
     dates: list[datetime]
 
 
-async def result(value: T | Awaitable[T]) -> T:
-    if asyncio.iscoroutine(value):
-        return await value
-    return value  # type: ignore
+@dataclass
+class StorageMirror:
+    """
+    In-process copy of the stored fingerprints and decoded v1 records.
+
+    `version` is the value of the `{prefix}:version` counter the copy matches,
+    None means the copy has to be reloaded.
+    """
+
+    version: int | None = None
+    # Fingerprint -> expiration timestamp
+    fingerprints: dict[str | bytes, float] = field(default_factory=dict)
+    v1_hashes: set[str] = field(default_factory=set)
+    v1_records: dict[str, _Record] = field(default_factory=dict)
+
+    def has_fingerprint(self, h: str | bytes, now: float) -> bool:
+        expires_at = self.fingerprints.get(h)
+        return expires_at is not None and expires_at > now
+
+    def add_fingerprints(self, hashes: Iterable[str | bytes], expires_at: float):
+        now = time.time()
+        self.fingerprints = {h: e for h, e in self.fingerprints.items() if e > now}
+        self.fingerprints.update(dict.fromkeys(hashes, expires_at))
+
+    def remove_v1(self, hashes: Iterable[str]):
+        for h in hashes:
+            self.v1_hashes.discard(h)
+            self.v1_records.pop(h, None)
 
 
 class Storage:
-    def __init__(self, r: Redis, prefix: str, ttl: int):
+    def __init__(
+        self,
+        r: Redis,
+        prefix: str,
+        ttl: int,
+        mirror: bool = False,
+        legacy_v1: bool = False,
+        metrics: Metrics | None = None,
+        executor: "Executor | None" = None,
+    ):
         self.r = r
+        # Runs the similarity search of the legacy diff in worker processes
+        self.executor = executor
+        self.metrics = metrics or Metrics()
         self.prefix = prefix
         self.ttl = ttl
+        # Keep reading and writing the v1 keys, e.g. while older instances run
+        self.legacy_v1 = legacy_v1
+
+        self.mirror: StorageMirror | None = StorageMirror() if mirror else None
 
         self.key_etag = f"{prefix}:etag"
+        self.key_last_modified = f"{prefix}:last_modified"
         self.key_hashes = f"{prefix}:items"
         self.key_ttls = f"{prefix}:ttls"
         self.key_records = f"{prefix}:records"
         self.key_records_v2 = f"{prefix}:records_v2"
+        self.key_records_v3 = f"{prefix}:records_v3"
+        # Fingerprints of the committed records in the layout this instance uses
+        self.key_fingerprints = (
+            self.key_records_v2 if legacy_v1 else self.key_records_v3
+        )
+        # Incremented by every write, lets mirrors detect changes made elsewhere
+        self.key_version = f"{prefix}:version"
+        self.key_schema = f"{prefix}:schema"
+        self.key_migration_lock = f"{prefix}:schema:lock"
 
         self.re_non_word = re.compile(r"\W")
 
-    async def migrate(self):
-        pass
+    async def migrate(self, batch_size: int = 500):
+        """
+        Brings the stored keyspace up to the schema version this instance uses:
+        `SCHEMA_VERSION`, or 1 while `legacy_v1` is set. Every step is recorded in
+        the `{prefix}:schema` key, so an interrupted migration resumes where it
+        stopped and concurrent instances wait for each other.
+
+        The steps delete the keys older instances use and can't be undone, a
+        schema newer than the target is an error rather than a fresh start.
+        """
+        target = 1 if self.legacy_v1 else SCHEMA_VERSION
+        migrations = {2: self._migrate_to_v2, 3: self._migrate_to_v3}
+
+        async with self.r.lock(
+            self.key_migration_lock, timeout=10 * 60, blocking_timeout=10 * 60
+        ):
+            version = int(await self.r.get(self.key_schema) or 1)
+            if version > target:
+                raise RuntimeError(
+                    f"Storage schema {version} is newer than {target}, "
+                    "the keys this instance uses were removed"
+                )
+
+            while version < target:
+                logger.info("Migrating storage schema %d -> %d", version, version + 1)
+                await migrations[version + 1](batch_size)
+                version += 1
+                await self.r.set(self.key_schema, version)
+
+        logger.info("Storage schema version %d", version)
+
+        if self.mirror is not None:
+            await self._load_mirror()
+
+    async def _migrate_to_v2(self, batch_size: int):
+        """
+        Retires the v1 keys.
+
+        v1 records can't be converted: their fingerprint needs the normalized
+        street names and the reason type, which v1 never stored. Nothing is lost,
+        every v1 record was written together with its v2 fingerprint, and the
+        records older than v2 have expired long ago.
+        """
+        removed = await self._remove_v1("+inf", batch_size)
+        # Members without a timestamp, if any, go in the background
+        async with self.r.pipeline() as pipe:
+            pipe.unlink(self.key_hashes, self.key_ttls, self.key_records)
+            pipe.incr(self.key_version)
+            await pipe.execute()
+        logger.info("Removed %d v1 records", removed)
+
+    async def _migrate_to_v3(self, batch_size: int):
+        """
+        Moves `records_v2` to `records_v3`, re-encoding the records and keeping
+        their expiration times.
+        """
+        converted = 0
+        cursor = 0
+        while True:
+            cursor, chunk = await self.r.hscan(
+                self.key_records_v2, cursor, count=batch_size
+            )
+            if chunk:
+                old_fields = list(chunk)
+                expiration = await self.r.hexpiretime(self.key_records_v2, *old_fields)
+
+                records = {}
+                by_expiration: dict[int, list[bytes]] = {}
+                for old_field, expires_at in zip(old_fields, expiration):
+                    if expires_at == -2:
+                        continue
+                    record = decode_record(chunk[old_field])
+                    h = self.fingerprint_v3(record)
+                    records[h] = encode_record(record)
+                    by_expiration.setdefault(expires_at, []).append(h)
+
+                async with self.r.pipeline() as pipe:
+                    if records:
+                        pipe.hset(self.key_records_v3, mapping=records)
+                    for expires_at, fields in by_expiration.items():
+                        if expires_at >= 0:
+                            pipe.hexpireat(self.key_records_v3, expires_at, *fields)
+                    pipe.hdel(self.key_records_v2, *old_fields)
+                    pipe.incr(self.key_version)
+                    await pipe.execute()
+
+                converted += len(records)
+
+            if not cursor:
+                break
+
+        await self.r.unlink(self.key_records_v2)
+        logger.info("Converted %d records to the compact encoding", converted)
+
+    def _validator_keys(self, source: str | None) -> tuple[str, str]:
+        if source is None:
+            return self.key_etag, self.key_last_modified
+        return f"{self.key_etag}:{source}", f"{self.key_last_modified}:{source}"
+
+    async def get_validators(
+        self, source: str | None = None
+    ) -> tuple[str | None, str | None]:
+        """
+        Returns the stored ETag and Last-Modified values of the last scraped page
+        of `source`, the default source keeps the unsuffixed keys.
+        """
+        etag, last_modified = await self.r.mget(*self._validator_keys(source))
+        return etag, last_modified
+
+    async def set_last_modified(self, last_modified: str, source: str | None = None):
+        await self.r.set(self._validator_keys(source)[1], last_modified)
 
-    async def is_etag_changed(self, etag: str | None) -> bool:
+    async def is_etag_changed(
+        self, etag: str | None, source: str | None = None
+    ) -> bool:
         if etag is None:
             return True
 
-        return (await result(self.r.set(self.key_etag, etag, get=True))) != etag
+        key = self._validator_keys(source)[0]
+        return (await self.r.set(key, etag, get=True)) != etag
 
     async def diff(self, records: list[ParsedRecord]) -> list[ParsedRecord]:
         """
@@ -72,23 +248,33 @@ class Storage:
         if not records:
             return []
 
-        changed = await self._diff_v2(records)
+        if self.mirror is not None:
+            await self._sync_mirror()
 
-        # TODO: remove after 2025-09-01
-        return await self._diff_v1(changed)
+        with self.metrics.stage("diff_fingerprints"):
+            changed = await self._diff_fingerprints(records)
+
+        if not self.legacy_v1:
+            return changed
+
+        with self.metrics.stage("diff_v1"):
+            return await self._diff_v1(changed)
 
     async def _diff_v1(self, records: list[ParsedRecord]) -> list[ParsedRecord]:
         """
-        Remove after 2025-09-01
+        Legacy, used only with `legacy_v1`
         """
         if not records:
             return []
 
         logger.info("Before diff %d records", len(records))
         hashes = [self.hash(record) for record in records]
-        members: list[Literal[0, 1]] = await result(
-            self.r.smismember(self.key_hashes, hashes)
-        )
+        if self.mirror is not None:
+            members: list[Literal[0, 1]] = [
+                int(h in self.mirror.v1_hashes) for h in hashes  # type: ignore
+            ]
+        else:
+            members = await self.r.smismember(self.key_hashes, hashes)
 
         changed = [
             record for record, is_member in zip(records, members) if not is_member
@@ -99,77 +285,82 @@ class Storage:
         if len(changed) == 0:
             return changed
 
-        stored: dict[str, _Record] = {
-            k: _Record.model_validate_json(v)
-            for k, v in (await result(self.r.hgetall(self.key_records))).items()
-        }
+        if self.mirror is not None:
+            stored = self.mirror.v1_records
+        else:
+            stored = {
+                k: _Record.model_validate_json(v)
+                for k, v in (await self.r.hgetall(self.key_records)).items()
+            }
 
         logger.info(
             "Diffing %d records with %d stored records", len(changed), len(stored)
         )
 
-        def is_new(stored: list[_Record]):
-            """
-            Return a function that checks if a record is new or not.
-
-            The function takes a `Record` as argument and checks if its address is
-            similar to any of the addresses in the `stored` list. If the similarity
-            ratio is greater than 0.8, it returns `False`. Otherwise, it returns
-            `True`.
-            """
-
-            s = SequenceMatcher()
-
-            def f(record: ParsedRecord):
-                """
-                Return True if record.address is not similar to any of the addresses in the stored list.
-                Otherwise, return False.
-
-                Similarity is checked using SequenceMatcher.ratio() with a threshold of 0.8.
-                """
-                s.set_seq2(record.address)
-                for stored_record in stored:
-                    s.set_seq1(stored_record.address)
-                    ratio = s.ratio()
-                    if ratio > 0.8 and stored_record.dates[-1] == record.dates[-1]:
-                        logger.info(
-                            "Skipping record %s as similar to %s with ratio %.2f",
-                            record,
-                            stored_record,
-                            ratio,
-                        )
-                        return False
-                return True
-
-            return f
-
-        changed = list(filter(is_new(stored.values()), changed))  # type: ignore
+        # A record is new if its address is not similar to any stored address
+        # with the same last date, SequenceMatcher.ratio() above 0.8
+        stored_records = list(stored.values())
+        args = (
+            [(r.address, r.dates[-1]) for r in stored_records],
+            [(r.address, r.dates[-1]) for r in changed],
+            0.8,
+        )
+        if self.executor:
+            matches = await self.executor.run(find_similar, *args)
+        else:
+            matches = find_similar(*args)
+
+        new = []
+        for record, match in zip(changed, matches):
+            if match is None:
+                new.append(record)
+                continue
+
+            i, ratio = match
+            logger.info(
+                "Skipping record %s as similar to %s with ratio %.2f",
+                record,
+                stored_records[i],
+                ratio,
+            )
+        changed = new
 
         logger.info("After diff filter %d records", len(changed))
 
         return changed
 
-    async def _diff_v2(self, records: list[ParsedRecord]) -> list[ParsedRecord]:
+    async def _diff_fingerprints(
+        self, records: list[ParsedRecord]
+    ) -> list[ParsedRecord]:
         if not records:
             return []
 
-        hashes = {self.hash_v2(record): record for record in records}
-        existed: set[str] = set(await result(self.r.hkeys(self.key_records_v2)))
+        hashes = {self.fingerprint(record): record for record in records}
+
+        if self.mirror is not None:
+            now = time.time()
+            return [
+                r for h, r in hashes.items() if not self.mirror.has_fingerprint(h, now)
+            ]
+
+        # Ask only about the candidates, the reply grows with the page size
+        # rather than with the retained history
+        async with self.r.pipeline(transaction=False) as pipe:
+            for h in hashes:
+                pipe.hexists(self.key_fingerprints, h)
+            existed: list[bool] = await pipe.execute()
 
-        return [hashes[h] for h in hashes if h not in existed]
+        return [hashes[h] for h, exists in zip(hashes, existed) if not exists]
 
     async def commit(self, records: list[ParsedRecord]):
         """
         Commits a list of records to the storage.
 
-        The method stores the hashes of the records in the `hashes` set,
-        their timestamps in the `ttls` sorted set and the records themselves
-        in the `records` hash map.
-
-        After that, it removes outdated records from the storage by
-        looking for records that have a timestamp older than the given TTL
-        in the `ttls` sorted set. If such records are found, they are removed
-        from the `hashes` set, the `ttls` sorted set and the `records` hash map.
+        The fingerprinted records with their TTLs, and with `legacy_v1` the v1
+        hashes, timestamps and records, are written in a single MULTI/EXEC
+        transaction, so a failed commit leaves nothing behind and is retried as a
+        whole on the next cycle. Outdated v1 records are removed separately by
+        `cleanup`.
 
         Args:
             records (list[Record]): A list of records to be stored in the storage.
@@ -177,83 +368,176 @@ class Storage:
         if not records:
             return
 
-        records_v2 = {
-            self.hash_v2(record): record.model_dump_json() for record in records
-        }
-
-        pipe = self.r.pipeline()
-        await result(pipe.hmset(self.key_records_v2, records_v2))
-        await result(
-            pipe.hexpire(
-                self.key_records_v2,
-                self.ttl,
-                *list(records_v2.keys()),
+        fingerprinted = {
+            self.fingerprint(record): (
+                record.model_dump_json() if self.legacy_v1 else encode_record(record)
             )
-        )
-        pipe.execute()
-
-        # TODO: remove after 2025-09-01
-        await self._commit_v1(records)
+            for record in records
+        }
 
-    async def _commit_v1(self, records: list[ParsedRecord]):
-        """
-        Remove after 2025-09-01
+        hashes: list[str] = []
+        stored: list[_Record] = []
+        if self.legacy_v1:
+            hashes = [self.hash(record) for record in records]
+            stored = [
+                _Record(
+                    area=record.area,
+                    organization=str(record.organization),
+                    address=record.address,
+                    dates=record.dates,
+                )
+                for record in records
+            ]
+
+        async with self.r.pipeline() as pipe:
+            pipe.hset(self.key_fingerprints, mapping=fingerprinted)  # type: ignore
+            pipe.hexpire(self.key_fingerprints, self.ttl, *fingerprinted.keys())
+            if self.legacy_v1:
+                pipe.sadd(self.key_hashes, *hashes)
+                pipe.zadd(
+                    self.key_ttls, dict.fromkeys(hashes, datetime.now().timestamp())
+                )
+                pipe.hset(
+                    self.key_records,
+                    mapping=dict(
+                        zip(hashes, [record.model_dump_json() for record in stored])
+                    ),
+                )
+            pipe.incr(self.key_version)
+            _, expired, *_, version = await pipe.execute()
+
+        if not_expiring := [h for h, res in zip(fingerprinted, expired) if res != 1]:
+            logger.error("Failed to set TTL of %d records", len(not_expiring))
+
+        expires_at = time.time() + self.ttl
+
+        def add(mirror: StorageMirror):
+            mirror.add_fingerprints(fingerprinted, expires_at)
+            mirror.v1_hashes.update(hashes)
+            mirror.v1_records.update(zip(hashes, stored))
+
+        self._update_mirror(version, add)
+
+    async def cleanup(self, batch_size: int = 500) -> int:
         """
+        Removes v1 records older than the TTL, at most `batch_size` per
+        transaction, and returns the number of removed records.
 
-        if not records:
-            return
+        Fingerprints expire on their own with the hash field TTLs.
+        """
+        if not self.legacy_v1:
+            return 0
 
-        hashes = [self.hash(record) for record in records]
+        removed = await self._remove_v1(
+            datetime.now().timestamp() - self.ttl, batch_size
+        )
+        if removed:
+            logger.info("Removed %d outdated records", removed)
 
-        pipe = self.r.pipeline()
+        return removed
 
-        await result(pipe.sadd(self.key_hashes, *hashes))
-        await result(
-            pipe.zadd(
-                self.key_ttls,
-                {self.hash(record): datetime.now().timestamp() for record in records},
+    async def _remove_v1(self, max_timestamp: float | str, batch_size: int) -> int:
+        removed = 0
+        while True:
+            to_remove = await self.r.zrangebyscore(
+                self.key_ttls, 0, max_timestamp, start=0, num=batch_size
             )
-        )
-        await result(
-            pipe.hmset(
-                self.key_records,
-                dict(
-                    zip(
-                        hashes,
-                        [
-                            _Record(
-                                area=record.area,
-                                organization=str(record.organization),
-                                address=record.address,
-                                dates=record.dates,
-                            ).model_dump_json()
-                            for record in records
-                        ],
-                    )
-                ),
+            if not to_remove:
+                break
+
+            async with self.r.pipeline() as pipe:
+                pipe.zrem(self.key_ttls, *to_remove)
+                pipe.srem(self.key_hashes, *to_remove)
+                pipe.hdel(self.key_records, *to_remove)
+                pipe.incr(self.key_version)
+                *_, version = await pipe.execute()
+
+            self._update_mirror(
+                version, partial(StorageMirror.remove_v1, hashes=to_remove)
             )
-        )
-        pipe.execute()
 
-        to_remove = await result(
-            self.r.zrangebyscore(
-                self.key_ttls, 0, datetime.now().timestamp() - self.ttl
+            removed += len(to_remove)
+            if len(to_remove) < batch_size:
+                break
+
+        return removed
+
+    async def _load_mirror(self):
+        """Loads stored fingerprints and v1 records into the in-process mirror"""
+        assert self.mirror is not None
+
+        # The version is read first: anything written after it makes the data
+        # newer than the version and is either applied again or reloaded
+        async with self.r.pipeline() as pipe:
+            pipe.get(self.key_version)
+            if self.legacy_v1:
+                pipe.smembers(self.key_hashes)
+                pipe.hgetall(self.key_records)
+            version, *v1 = await pipe.execute()
+        hashes, records = v1 or (set(), {})
+
+        if self.legacy_v1:
+            fields = await self.r.hkeys(self.key_fingerprints)
+        else:
+            # Binary digests
+            fields = await self.r.execute_command(
+                "HKEYS", self.key_fingerprints, **{NEVER_DECODE: True}
             )
+
+        expiration: dict[str | bytes, float] = {}
+        for i in range(0, len(fields), _MIRROR_BATCH_SIZE):
+            batch = fields[i : i + _MIRROR_BATCH_SIZE]
+            times = await self.r.hexpiretime(self.key_fingerprints, *batch)
+            for h, expires_at in zip(batch, times):
+                if expires_at == -1:
+                    expiration[h] = float("inf")
+                elif expires_at >= 0:
+                    expiration[h] = expires_at
+
+        self.mirror.version = int(version or 0)
+        self.mirror.fingerprints = expiration
+        self.mirror.v1_hashes = set(hashes)
+        self.mirror.v1_records = {
+            k: _Record.model_validate_json(v) for k, v in records.items()
+        }
+
+        logger.info(
+            "Loaded storage mirror: version %d, %d fingerprints, %d v1 records",
+            self.mirror.version,
+            len(self.mirror.fingerprints),
+            len(self.mirror.v1_records),
         )
-        if not to_remove:
-            return
 
-        logger.info("Removing %d outdated records", len(to_remove))
+    async def _sync_mirror(self):
+        """Reloads the mirror if Redis was changed by anyone else"""
+        assert self.mirror is not None
 
-        pipe = self.r.pipeline()
-        await result(pipe.zrem(self.key_ttls, *to_remove))
-        await result(pipe.srem(self.key_hashes, *to_remove))
-        await result(pipe.hdel(self.key_records, *to_remove))
-        pipe.execute()
+        version = int(await self.r.get(self.key_version) or 0)
+        if version != self.mirror.version:
+            logger.info(
+                "Storage mirror is stale (%s, stored %d), reloading",
+                self.mirror.version,
+                version,
+            )
+            await self._load_mirror()
+
+    def _update_mirror(self, version: int, apply: Callable[[StorageMirror], None]):
+        """
+        Applies a local change to the mirror if it was the only change since the
+        mirror version, otherwise marks the mirror for reloading.
+        """
+        if self.mirror is None:
+            return
+
+        if self.mirror.version is not None and version == self.mirror.version + 1:
+            apply(self.mirror)
+            self.mirror.version = version
+        else:
+            self.mirror.version = None
 
     def hash(self, record: ParsedRecord) -> str:
         """
-        Remove after 2025-09-01
+        Legacy, used only with `legacy_v1`
         """
         return (
             hashlib.md5(
@@ -267,6 +551,20 @@ class Storage:
             .hex()
         )
 
+    def fingerprint(self, record: ParsedRecord) -> str | bytes:
+        return self.hash_v2(record) if self.legacy_v1 else self.fingerprint_v3(record)
+
+    def fingerprint_v3(self, record: ParsedRecord) -> bytes:
+        """
+        64-bit digest of the street names, reason type and the first date,
+        the same fields as `hash_v2`.
+        """
+        return digest(
+            ",".join([s.name for s in record.details.streets]),
+            record.details.reason.type if record.details.reason else "",
+            format_dates(record.dates[:1]),
+        )
+
     def hash_v2(self, record: ParsedRecord) -> str:
         """
         Generate a hash string for a ParsedRecord using its area, street names,
@@ -0,0 +1,139 @@
+"""
+HTTP client settings of the scrapers: timeouts, the keep-alive pool and retries
+of failed requests with exponential backoff, limited by a retry budget.
+"""
+
+import asyncio
+import logging
+import random
+from typing import AsyncIterator
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth another attempt, the rest are returned as they are
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class ResponseTooLargeError(Exception):
+    pass
+
+
+def create_client(
+    connect_timeout: float = 5.0,
+    read_timeout: float = 30.0,
+    max_connections: int = 10,
+    keepalive_expiry: float = 30.0,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> httpx.AsyncClient:
+    """
+    Client with explicit timeouts and a persistent connection pool. httpx asks
+    for gzip and deflate compressed responses (and brotli or zstd when their
+    packages are installed) and decodes them transparently.
+    """
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        transport=transport,
+    )
+
+
+class RetryBudget:
+    """
+    Every request deposits `ratio` of a retry and every retry withdraws one, so
+    retries stay a bounded share of the traffic while the server is failing.
+    `reserve` retries are allowed before any deposits.
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve: int = 3):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._balance = float(reserve)
+
+    def deposit(self):
+        self._balance = min(self._balance + self.ratio, self.reserve + 1)
+
+    def withdraw(self) -> bool:
+        if self._balance < 1:
+            return False
+        self._balance -= 1
+        return True
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        budget: RetryBudget | None = None,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget or RetryBudget()
+
+    async def send(
+        self, client: httpx.AsyncClient, request: httpx.Request
+    ) -> httpx.Response:
+        """
+        Sends a streaming request, retrying transport errors and the
+        `RETRY_STATUSES` with full jitter backoff while the budget allows.
+        """
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            error: httpx.TransportError | None = None
+            response: httpx.Response | None = None
+            try:
+                response = await client.send(request, stream=True)
+            except httpx.TransportError as e:
+                error = e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+
+            if attempt >= self.retries or not self.budget.withdraw():
+                if response is not None:
+                    return response
+                assert error is not None
+                raise error
+
+            if response is not None:
+                await response.aclose()
+            delay = random.uniform(0, min(self.backoff * 2**attempt, self.max_backoff))
+            attempt += 1
+            logger.warning(
+                "Retrying %s in %.2fs (attempt %d): %s",
+                request.url,
+                delay,
+                attempt,
+                error or response.status_code,  # type: ignore[union-attr]
+            )
+            await asyncio.sleep(delay)
+
+
+async def iter_limited(
+    response: httpx.Response, max_size: int | None
+) -> AsyncIterator[bytes]:
+    """Yields the decoded body, failing once it exceeds `max_size` bytes"""
+    if max_size is None:
+        async for chunk in response.aiter_bytes():
+            yield chunk
+        return
+
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit() and int(length) > max_size:
+        raise ResponseTooLargeError(f"Content-Length {length} exceeds {max_size}")
+
+    received = 0
+    async for chunk in response.aiter_bytes():
+        received += len(chunk)
+        if received > max_size:
+            raise ResponseTooLargeError(f"Response body exceeds {max_size} bytes")
+        yield chunk
@@ -0,0 +1,89 @@
+"""
+parse_dates/format_dates against the previous setlocale-based implementation.
+
+    python -m benchmarks.dates --number 20000
+
+The previous implementation needs the ru_RU.UTF-8 locale, it is skipped when
+the locale is not installed.
+"""
+
+import argparse
+import locale
+import re
+import timeit
+from contextlib import contextmanager
+from datetime import datetime
+
+from app.parser.utils import format_dates, parse_dates
+
+LOCALE_RUSSIAN = "ru_RU.UTF-8"
+DATE_PATTERN = r"(\d{1,2})\s+(\w+)\s+(\d{2})[-:](\d{2})"
+
+SAMPLE = "с 18 октября 09-00 до 19 октября 24-00"
+
+
+@contextmanager
+def setlocale(name):
+    saved = locale.setlocale(locale.LC_ALL)
+    try:
+        yield locale.setlocale(locale.LC_ALL, name)
+    finally:
+        locale.setlocale(locale.LC_ALL, saved)
+
+
+def locale_parse_dates(dates: str) -> list[datetime]:
+    current_year = datetime.now().year
+    found = re.findall(DATE_PATTERN, dates)
+
+    with setlocale(LOCALE_RUSSIAN):
+        return [
+            datetime.strptime(
+                f"{day} {month} {current_year} "
+                f"{hour.replace('24', '23')}:{minutes if hour != '24' else '59'}",
+                "%d %B %Y %H:%M",
+            )
+            for day, month, hour, minutes in found
+        ]
+
+
+def locale_format_dates(dates: list[datetime]) -> str:
+    with setlocale(LOCALE_RUSSIAN):
+        return " ".join([date.strftime("%d %B %H-%M").lower() for date in dates])
+
+
+def has_locale() -> bool:
+    try:
+        with setlocale(LOCALE_RUSSIAN):
+            return True
+    except locale.Error:
+        return False
+
+
+def bench(name: str, func, number: int):
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{name:<24} {seconds / number * 1e6:8.2f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    dates = parse_dates(SAMPLE)
+
+    bench("parse_dates", lambda: parse_dates(SAMPLE), args.number)
+    bench("format_dates", lambda: format_dates(dates), args.number)
+
+    if not has_locale():
+        print(f"{LOCALE_RUSSIAN} is not installed, skipping the locale version")
+        return
+
+    assert locale_parse_dates(SAMPLE) == dates
+    assert locale_format_dates(dates) == format_dates(dates)
+
+    bench("locale parse_dates", lambda: locale_parse_dates(SAMPLE), args.number)
+    bench("locale format_dates", lambda: locale_format_dates(dates), args.number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Redis traffic of `Storage.diff` for a growing stored history: one pipelined
+HEXISTS per candidate fingerprint, against the reply a full HKEYS of the
+fingerprint hash would take.
+
+    python -m benchmarks.diff --stored 1000 10000 100000 --candidates 50 300
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from redis.client import NEVER_DECODE
+
+from app.storage import Storage
+from benchmarks.encoding import make_record
+from benchmarks.fake_redis import FakeRedis
+
+TTL = 5 * 24 * 60 * 60
+COMMIT_BATCH_SIZE = 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stored", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--candidates", type=int, nargs="+", default=[50, 300])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(
+        f"{'stored':>8} {'candidates':>10} {'hkeys, KiB':>11}"
+        f" {'diff, KiB':>10} {'diff, ms':>9} {'round trips':>12}"
+    )
+    for stored in args.stored:
+        r = FakeRedis()
+        storage = Storage(r, "bench", TTL)  # type: ignore[arg-type]
+        records = [make_record(rng, i) for i in range(stored)]
+        for i in range(0, stored, COMMIT_BATCH_SIZE):
+            await storage.commit(records[i : i + COMMIT_BATCH_SIZE])
+
+        r.reset_stats()
+        await r.execute_command(
+            "HKEYS", storage.key_fingerprints, **{NEVER_DECODE: True}
+        )
+        hkeys_bytes = r.reply_bytes
+
+        for count in args.candidates:
+            # Most of the page is already stored, a few rows are new
+            new = [make_record(rng, stored + i) for i in range(count // 10)]
+            candidates = records[: count - len(new)] + new
+
+            r.reset_stats()
+            start = time.perf_counter()
+            changed = await storage.diff(candidates)
+            elapsed = time.perf_counter() - start
+            assert changed == new
+            assert set(r.commands) == {"hexists"}
+
+            print(
+                f"{stored:>8} {count:>10} {hkeys_bytes / 1024:11.1f}"
+                f" {r.reply_bytes / 1024:10.1f} {elapsed * 1000:9.2f}"
+                f" {r.round_trips:>12}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+"""
+Memory and speed of the stored record encodings: JSON under 32-character hex MD5
+fields (`records_v2`) against the compact binary encoding under 64-bit digests
+(`records_v3`).
+
+Encoding runs at about the speed of `model_dump_json`, except that each
+comment over `COMPRESS_THRESHOLD` bytes costs about 10 us of zlib, which is
+where most of the memory saving of these records comes from. Storage.commit
+encodes every record of a cycle, so a page of 2000 rows takes a few more ms
+of CPU per cycle for about a third less Redis memory. Decoding is about 1.5x
+slower than pydantic's JSON parser, which runs in Rust, while the binary
+decoder builds the models in Python. Only the migration decodes stored
+values. The digests are BLAKE2b truncated to 64 bits, a non-cryptographic
+hash would need a new dependency.
+
+Sizes are the raw field and value bytes. With --redis-url the records are also
+written to a scratch hash on that server and `MEMORY USAGE` is reported.
+
+    python -m benchmarks.encoding --records 1000 --redis-url redis://localhost
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from datetime import datetime, timedelta
+
+from apis.models import (
+    OrganizationInfo,
+    OutageDetails,
+    Reason,
+    ResourceType,
+    Street,
+)
+
+from app.codec import decode_record, digest, encode_record
+from app.publisher import ParsedRecord
+
+STREETS = ["Ленина", "Мира", "Карла Маркса", "Молокова", "Взлётная", "9 Мая"]
+COMMENT = (
+    "Отключение в связи с проведением ремонтных работ на тепловых сетях. "
+    "Подвоз воды будет организован по заявкам жителей. "
+)
+
+
+def make_record(rng: random.Random, i: int) -> ParsedRecord:
+    start = datetime(2025, 6, 1, 9) + timedelta(hours=rng.randrange(24 * 90))
+    streets = [
+        Street(
+            name=f"улица {rng.choice(STREETS)} {i}",
+            buildings=[str(rng.randrange(1, 200)) for _ in range(rng.randrange(1, 8))],
+        )
+        for _ in range(rng.randrange(1, 4))
+    ]
+    return ParsedRecord(
+        area=rng.choice(["Кировский район", "Октябрьский район", "Центральный район"]),
+        organization=OrganizationInfo(
+            resource_type=ResourceType.HOT_WATER,
+            resource="Горячее водоснабжение",
+            organization="АО «Красноярская теплотранспортная компания»",
+            phones=["205-05-00", "8-800-200-00-00"],
+        ),
+        details=OutageDetails(
+            streets=streets,
+            reason=Reason(type="плановое", description="ремонт тепловых сетей"),
+            comments=COMMENT * rng.randrange(0, 6) or None,
+        ),
+        dates=[start, start + timedelta(hours=rng.randrange(2, 72))],
+    )
+
+
+def json_entry(record: ParsedRecord) -> tuple[str, str]:
+    key = hashlib.md5(record.address.encode()).digest().hex()
+    return key, record.model_dump_json()
+
+
+def compact_entry(record: ParsedRecord) -> tuple[bytes, bytes]:
+    return digest(record.address), encode_record(record)
+
+
+def timed(func, items, repeat: int = 5) -> tuple[list, float]:
+    """The results and the best of `repeat` runs in microseconds per item"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = [func(item) for item in items]
+        best = min(best, time.perf_counter() - start)
+    return result, best / len(items) * 1e6
+
+
+async def memory_usage(url: str, entries: dict) -> int:
+    from redis.asyncio import Redis
+
+    key = f"bench:encoding:{time.time_ns()}"
+    r = Redis.from_url(url)
+    try:
+        for i in range(0, len(entries), 1000):
+            await r.hset(key, mapping=dict(list(entries.items())[i : i + 1000]))
+        return await r.memory_usage(key, samples=0)
+    finally:
+        await r.delete(key)
+        await r.aclose()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    records = [make_record(rng, i) for i in range(args.records)]
+
+    results = {}
+    for name, entry, decode in (
+        ("json", json_entry, ParsedRecord.model_validate_json),
+        ("compact", compact_entry, decode_record),
+    ):
+        entries, encode_us = timed(entry, records)
+        decoded, decode_us = timed(decode, [value for _, value in entries])
+        assert decoded == records
+
+        size = sum(len(k) + len(v) for k, v in entries) / len(entries)
+        redis_size = None
+        if args.redis_url:
+            redis_size = await memory_usage(args.redis_url, dict(entries)) / len(
+                entries
+            )
+        results[name] = (size, encode_us, decode_us, redis_size)
+
+    print(
+        f"{'encoding':>8} {'bytes/record':>13} {'redis bytes/record':>19}"
+        f" {'encode, us':>11} {'decode, us':>11}"
+    )
+    for name, (size, encode_us, decode_us, redis_size) in results.items():
+        redis_column = f"{redis_size:19.1f}" if redis_size is not None else f"{'-':>19}"
+        print(
+            f"{name:>8} {size:13.1f} {redis_column}"
+            f" {encode_us:11.2f} {decode_us:11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+fakeredis client that counts round trips, commands and reply sizes, so the
+benchmarks can compare Redis traffic without a server.
+"""
+
+from collections import Counter
+from typing import Any
+
+from fakeredis import FakeAsyncRedis
+from redis.asyncio.client import Pipeline
+
+
+def _size(value: Any) -> int:
+    if value is None or isinstance(value, (int, float)):
+        return 8
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, dict):
+        return sum(_size(k) + _size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(_size(v) for v in value)
+    return 8
+
+
+class FakeRedis(FakeAsyncRedis):
+    def __init__(self, *args, decode_responses: bool = True, **kwargs):
+        super().__init__(*args, decode_responses=decode_responses, **kwargs)
+        self.round_trips = 0
+        self.commands: Counter[str] = Counter()
+        self.reply_bytes = 0
+
+    def reset_stats(self):
+        self.round_trips = 0
+        self.commands.clear()
+        self.reply_bytes = 0
+
+    def count(self, names: list[str], replies: list[Any]):
+        """Counts one round trip carrying the `names` commands"""
+        self.round_trips += 1
+        self.commands.update(str(name).lower() for name in names)
+        self.reply_bytes += sum(_size(reply) for reply in replies)
+
+    async def execute_command(self, *args, **options):
+        reply = await super().execute_command(*args, **options)
+        self.count([args[0]], [reply])
+        return reply
+
+    def pipeline(
+        self, transaction: bool = True, shard_hint: str | None = None
+    ) -> "CountedPipeline":
+        return CountedPipeline(self, transaction, shard_hint)
+
+
+class CountedPipeline(Pipeline):
+    def __init__(self, redis: FakeRedis, transaction: bool, shard_hint: str | None):
+        super().__init__(
+            redis.connection_pool, redis.response_callbacks, transaction, shard_hint
+        )
+        self._counter = redis
+
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:
+        names = [args[0] for args, _ in self.command_stack]
+        replies = await super().execute(raise_on_error)
+        if names:
+            self._counter.count(names, replies)
+        return replies
@@ -0,0 +1,265 @@
+"""
+End-to-end load test: the real PeriodicTask loop scraping generated pages from a
+local HTTP server, with fakeredis and the stub address parser.
+
+    python -m benchmarks.load --rows 2000 --churn 0.05 --cycles 50
+    python -m benchmarks.load --rows 5000 --etag none --parser-delay 0.002
+    python -m benchmarks.load --rows 20000 --workers 4
+
+--etag sets how the server validates the page: "content" changes the ETag with
+the content and answers If-None-Match with 304, "always" sends a new ETag on
+every request, "none" sends no ETag so the body digest is compared.
+
+The loop lag is how late a 10 ms timer fires on the event loop while the cycles
+run, it shows how long CPU-bound stages block Redis I/O and signal handling.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+from email.utils import formatdate
+
+from app.executor import Executor
+from app.parser import CachedNormalizer, OrganizationParser, OutageDetailsParser
+from app.publisher import Publisher
+from app.scheduler import PeriodicTask
+from app.scraper import Scraper
+from app.storage import Storage
+from benchmarks.fake_redis import FakeRedis
+from benchmarks.pages import PageGenerator
+from benchmarks.stubs import StubAddressParser
+
+TTL = 5 * 24 * 60 * 60
+
+
+class PageServer:
+    """
+    Minimal HTTP/1.1 server for one generated page. Every request advances the
+    generator, so each scrape sees about `churn` of the rows changed.
+    """
+
+    def __init__(self, generator: PageGenerator, etag: str = "content"):
+        self.generator = generator
+        self.etag = etag
+
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+
+        self._server: asyncio.Server | None = None
+        self._page = generator.page()
+        self._version = 0
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/aspx/Gorod.htm"
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        assert self._server is not None
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while request := await reader.readuntil(b"\r\n\r\n"):
+                headers = {}
+                for line in request.decode("latin-1").split("\r\n")[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                writer.write(self._respond(headers.get("if-none-match")))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _respond(self, if_none_match: str | None) -> bytes:
+        self.requests += 1
+        if self.requests > 1 and self.generator.advance():
+            self._page = self.generator.page()
+            self._version += 1
+
+        headers = {
+            "Content-Type": "text/html; charset=windows-1251",
+            "Last-Modified": formatdate(usegmt=True),
+        }
+        if self.etag == "content":
+            headers["ETag"] = f'"{self._version}"'
+        elif self.etag == "always":
+            headers["ETag"] = f'"{self._version}-{self.requests}"'
+
+        if if_none_match is not None and if_none_match == headers.get("ETag"):
+            self.not_modified += 1
+            status, body = "304 Not Modified", b""
+        else:
+            status, body = "200 OK", self._page
+        headers["Content-Length"] = str(len(body))
+
+        head = f"HTTP/1.1 {status}\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in headers.items()
+        )
+        self.bytes_sent += len(body)
+        return head.encode("latin-1") + b"\r\n" + body
+
+
+def percentile(values: list[float], q: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--churn", type=float, default=0.05)
+    parser.add_argument("--cycles", type=int, default=30)
+    parser.add_argument("--interval", type=float, default=0.0)
+    parser.add_argument(
+        "--etag", choices=["content", "always", "none"], default="content"
+    )
+    parser.add_argument("--parser-delay", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mirror", action="store_true")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    executor = Executor(args.workers) if args.workers else None
+    r = FakeRedis()
+    storage = Storage(r, "load", TTL, mirror=args.mirror, executor=executor)
+    if args.mirror:
+        await storage._load_mirror()
+    publisher = Publisher(r, "load")
+    normalizer = CachedNormalizer(
+        StubAddressParser(delay=args.parser_delay),
+        r,
+        prefix="load",
+        ttl=TTL,
+        cache_size=8192,
+        concurrency=args.concurrency,
+    )
+
+    latencies: list[float] = []
+    round_trips: list[int] = []
+    published: list[int] = []
+    records: list[int] = []
+    lags: list[float] = []
+
+    async def measure_lag():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    async with PageServer(
+        PageGenerator(args.rows, churn=args.churn, seed=args.seed), etag=args.etag
+    ) as server, Scraper(server.url, storage=storage, executor=executor) as scraper:
+        task = PeriodicTask(
+            scraper=scraper,
+            storage=storage,
+            publisher=publisher,
+            outage_parser=OutageDetailsParser(normalizer, concurrency=args.concurrency),
+            organization_parser=OrganizationParser(),
+            interval=args.interval,
+            concurrency=args.concurrency,
+            executor=executor,
+        )
+
+        run = task.run
+        scrape = scraper.run
+
+        async def counted_scrape():
+            result = await scrape()
+            records.append(len(result))
+            return result
+
+        async def timed_run():
+            r.reset_stats()
+            start = time.perf_counter()
+            await run()
+            latencies.append(time.perf_counter() - start)
+            round_trips.append(r.round_trips)
+            published.append(r.commands["publish"])
+            if len(latencies) >= args.cycles:
+                await task.stop()
+
+        scraper.run = counted_scrape  # type: ignore[method-assign]
+        task.run = timed_run  # type: ignore[method-assign]
+        lag = asyncio.create_task(measure_lag())
+        await task.start()
+        lag.cancel()
+
+    if executor:
+        executor.shutdown()
+
+    total = sum(latencies)
+    report = {
+        "rows": args.rows,
+        "churn": args.churn,
+        "etag": args.etag,
+        "workers": args.workers,
+        "cycles": len(latencies),
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p90": percentile(latencies, 90) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000,
+        },
+        "loop_lag_ms": {
+            "p50": percentile(lags, 50) * 1000,
+            "p99": percentile(lags, 99) * 1000,
+            "max": max(lags) * 1000,
+        },
+        "records_per_second": sum(records) / total if total else 0.0,
+        "redis_round_trips_per_cycle": statistics.fmean(round_trips),
+        "published": sum(published),
+        "not_modified": server.not_modified,
+        "mb_served": server.bytes_sent / 1e6,
+        "parser_calls": normalizer.address_parser.calls,
+    }
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+
+    latency = report["latency_ms"]
+    print(
+        f"{report['cycles']} cycles of {args.rows} rows, churn {args.churn:.0%},"
+        f" ETag {args.etag}"
+    )
+    print(
+        f"cycle latency, ms: p50 {latency['p50']:.1f}  p90 {latency['p90']:.1f}"
+        f"  p99 {latency['p99']:.1f}  max {latency['max']:.1f}"
+    )
+    lag = report["loop_lag_ms"]
+    print(
+        f"loop lag, ms: p50 {lag['p50']:.1f}  p99 {lag['p99']:.1f}"
+        f"  max {lag['max']:.1f}"
+    )
+    print(f"records per second: {report['records_per_second']:.0f}")
+    print(f"Redis round trips per cycle: {report['redis_round_trips_per_cycle']:.1f}")
+    print(
+        f"published {report['published']}, 304 responses {report['not_modified']},"
+        f" served {report['mb_served']:.1f} MB,"
+        f" address parser calls {report['parser_calls']}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+"""
+Synthetic outage pages in the layout of the source page (see
+tests/fixtures/Gorod.htm), encoded as windows-1251.
+
+`PageGenerator` keeps a version per row, `advance` changes a share of the rows
+the way the source page changes between scrapes.
+"""
+
+import random
+from datetime import datetime, timedelta
+from html import escape
+from pathlib import Path
+
+from app.parser.utils import format_dates
+
+FIXTURE = Path(__file__).parent.parent / "tests" / "fixtures" / "Gorod.htm"
+
+AREAS = [
+    "Железнодорожный район",
+    "Кировский район",
+    "Ленинский район",
+    "Октябрьский район",
+    "Свердловский район",
+    "Советский район",
+    "Центральный район",
+]
+ORGANIZATIONS = [
+    "Горячее водоснабжение<br>АО КТТК<br>т. 264-18-62<br>т. 214-93-51",
+    "Холодное водоснабжение<br>ООО КрасКом<br>т. 205-05-00",
+    "Электроснабжение<br>ПАО Россети Сибирь<br>т. 8-800-220-0-220",
+    "Теплоснабжение<br>АО &laquo;Енисейская ТГК&raquo;<br>т. 274-05-05",
+]
+STREETS = [
+    "Ленина",
+    "Мира",
+    "Карла Маркса",
+    "Вильского",
+    "Петра Словцова",
+    "Гусарова",
+    "Кольцевая",
+    "Красноярский рабочий",
+    "Мате Залки",
+    "Космонавтов",
+    "Взлётная",
+    "9 Мая",
+]
+REASONS = [
+    "плановое - замена опоры",
+    "аварийное - повреждение кабельной линии",
+    "плановое - переврезка подающего трубопровода",
+    "аварийное - причина выясняется",
+]
+
+
+def recorded_page() -> bytes:
+    return FIXTURE.read_bytes()
+
+
+class PageGenerator:
+    def __init__(self, rows: int, churn: float = 0.0, seed: int = 0):
+        self.rows = rows
+        self.churn = churn
+        self.seed = seed
+
+        self.versions = [0] * rows
+        self.generation = 0
+        self._rng = random.Random(seed)
+        # Dates are relative to the start, so the records stay in the future
+        self._start = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    def advance(self) -> int:
+        """Changes about `churn` of the rows, returns the number of changed rows"""
+        self.generation += 1
+        changed = 0
+        for i in range(self.rows):
+            if self._rng.random() < self.churn:
+                self.versions[i] = self.generation
+                changed += 1
+        return changed
+
+    def row(self, i: int) -> tuple[str, str, str, str]:
+        """Area, organization, address and dates cells of row `i`, as HTML"""
+        rng = random.Random(f"{self.seed}:{i}:{self.versions[i]}")
+
+        # The first building number keeps the rows unique
+        streets = "; ".join(
+            f"{rng.choice(STREETS)} "
+            + ", ".join(
+                [str(200 + i)] * (j == 0)
+                + [str(rng.randrange(1, 200)) for _ in range(rng.randrange(1, 5))]
+            )
+            for j in range(rng.randrange(1, 4))
+        )
+        address = f"{escape(streets)};<br>{rng.choice(REASONS)}"
+
+        start = self._start + timedelta(hours=rng.randrange(1, 24 * 5))
+        end = start + timedelta(hours=rng.randrange(2, 48))
+        dates = f"с {format_dates([start])}<br>до {format_dates([end])}"
+
+        return (
+            AREAS[i * len(AREAS) // max(self.rows, 1)],
+            rng.choice(ORGANIZATIONS),
+            address,
+            dates,
+        )
+
+    def page(self) -> bytes:
+        parts = [
+            '<html><head><meta http-equiv="Content-Type" '
+            'content="text/html; charset=windows-1251"></head><body>',
+            '<table border="1" cellspacing="0" cellpadding="2" width="100%">',
+            "<tr><td><b>Ресурс<br>Организация</b></td><td><b>Адрес</b></td>"
+            "<td><b>Время отключения</b></td></tr>",
+        ]
+        area = None
+        for i in range(self.rows):
+            row_area, organization, address, dates = self.row(i)
+            if row_area != area:
+                area = row_area
+                parts.append(f"<tr><td>&nbsp;</td><td><b>{area}</b></td><td></td></tr>")
+            parts.append(
+                f"<tr>\n  <td>{organization}</td>\n  <td>{address}</td>\n"
+                f"  <td>{dates}</td>\n</tr>"
+            )
+        parts.append("</table></body></html>")
+
+        return "\n".join(parts).encode("windows-1251")
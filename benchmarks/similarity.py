@@ -0,0 +1,100 @@
+"""
+Scaling of the v1 similarity check: brute-force SequenceMatcher loop against
+SimilarityIndex for a growing number of stored records.
+
+    python -m benchmarks.similarity --sizes 1000 5000 20000 50000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from difflib import SequenceMatcher
+
+from app.similarity import SimilarityIndex
+
+STREETS = [
+    "улица Ленина",
+    "проспект Мира",
+    "Кольцевая улица",
+    "улица Вильского",
+    "улица Петра Словцова",
+    "Лесопарковая улица",
+    "проспект имени газеты Красноярский Рабочий",
+    "улица Мате Залки",
+    "Новгородская улица",
+    "проспект Металлургов",
+]
+
+
+def make_address(rng: random.Random) -> str:
+    streets = rng.sample(STREETS, rng.randint(1, 4))
+    lines = []
+    for street in streets:
+        buildings = [str(rng.randint(1, 150)) for _ in range(rng.randint(1, 6))]
+        lines.append(f"{street} {', '.join(buildings)}")
+    return "\n".join(lines)
+
+
+def make_end_date(rng: random.Random) -> datetime:
+    # Outages end on one of the next days at a round hour
+    return datetime(2025, 1, 1) + timedelta(
+        days=rng.randint(0, 5), hours=rng.choice(range(8, 24))
+    )
+
+
+def brute_force(
+    stored: list[tuple[str, datetime]], address: str, end: datetime
+) -> bool:
+    s = SequenceMatcher()
+    s.set_seq2(address)
+    for stored_address, stored_end in stored:
+        s.set_seq1(stored_address)
+        if s.ratio() > 0.8 and stored_end == end:
+            return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 5000, 10000, 20000, 50000]
+    )
+    parser.add_argument("--changed", type=int, default=50)
+    parser.add_argument(
+        "--brute-max",
+        type=int,
+        default=2000,
+        help="skip the brute-force loop above this number of stored records",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'stored':>8} {'build, ms':>10} {'index, ms':>10} {'brute, ms':>10}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        stored = [(make_address(rng), make_end_date(rng)) for _ in range(size)]
+        changed = [(make_address(rng), make_end_date(rng)) for _ in range(args.changed)]
+
+        start = time.perf_counter()
+        index: SimilarityIndex[int] = SimilarityIndex(threshold=0.8)
+        for i, (address, end) in enumerate(stored):
+            index.add(address, end, i)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = [index.find(address, end) is not None for address, end in changed]
+        indexed = time.perf_counter() - start
+
+        brute = "-"
+        if size <= args.brute_max:
+            start = time.perf_counter()
+            expected = [brute_force(stored, address, end) for address, end in changed]
+            brute = f"{(time.perf_counter() - start) * 1000:10.1f}"
+            assert found == expected, "index disagrees with brute force"
+
+        print(f"{size:>8} {build * 1000:10.1f} {indexed * 1000:10.1f} {brute:>10}")
+
+
+if __name__ == "__main__":
+    main()
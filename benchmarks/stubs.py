@@ -0,0 +1,35 @@
+"""Deterministic stand-ins for the external services used by the benchmarks"""
+
+import asyncio
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Match:
+    name: str
+    confidence: float
+
+
+class StubAddressParser:
+    """
+    AddressParser replacement: every street is accepted as "улица <name>",
+    names starting with a digit are rejected. `delay` simulates the model latency.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def normalize(self, street_name: str) -> Match | None:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if street_name[:1].isdigit():
+            return None
+        return Match(name=f"улица {street_name}", confidence=0.9)
@@ -0,0 +1,266 @@
+"""
+Timings of every stage of the monitor pipeline on the recorded page and on a
+synthetic page of --rows rows, written as JSON for comparing commits.
+
+    python -m benchmarks.suite --rows 2000 --output before.json
+    python -m benchmarks.suite --rows 2000 --compare before.json
+
+Street names are normalized by a deterministic stub and Redis is replaced by
+fakeredis, so the storage and publisher stages include its command handling
+instead of network round trips. Logging is disabled while measuring.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable
+
+import httpx
+
+from app.parser import (
+    OrganizationParser,
+    OutageDetailsParser,
+    TableRowExtractor,
+    format_dates,
+    parse_dates,
+)
+from app.publisher import ParsedRecord, Publisher
+from app.scraper import Scraper
+from app.storage import Storage
+from benchmarks.fake_redis import FakeRedis
+from benchmarks.pages import PageGenerator, recorded_page
+from benchmarks.stubs import StubAddressParser
+
+TTL = 5 * 24 * 60 * 60
+
+Run = Callable[[], Awaitable[object]]
+
+
+@dataclass
+class Case:
+    name: str
+    # Units of work done by one run, for the per item time
+    items: int
+    # Called before every run, outside of the timing
+    prepare: Callable[[], Awaitable[Run]]
+
+
+def static(run: Run) -> Callable[[], Awaitable[Run]]:
+    async def prepare() -> Run:
+        return run
+
+    return prepare
+
+
+def extract_rows(page: bytes) -> list[tuple[str, str, str, str]]:
+    extractor = TableRowExtractor(encoding="windows-1251")
+    return extractor.feed_bytes(page) + extractor.close()
+
+
+def scraper_case(name: str, page: bytes, rows: int) -> Case:
+    etags = iter(range(sys.maxsize))
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        # A new ETag on every request, so every run parses the page
+        return httpx.Response(200, content=page, headers={"ETag": f'"{next(etags)}"'})
+
+    scraper = Scraper(
+        "http://bench.local/Gorod.htm",
+        storage=Storage(FakeRedis(), "bench", TTL),
+        transport=httpx.MockTransport(handler),
+    )
+
+    async def prepare() -> Run:
+        if scraper._session is None:
+            await scraper.__aenter__()
+        return scraper.run
+
+    return Case(name, rows, prepare)
+
+
+async def build_cases(rows: int, seed: int) -> list[Case]:
+    fixture = recorded_page()
+    synthetic = PageGenerator(rows, seed=seed).page()
+
+    table = extract_rows(synthetic)
+    dates_text = [dates for _, _, _, dates in table]
+    dates = [parse_dates(text) for text in dates_text]
+
+    organization_parser = OrganizationParser()
+    outage_parser = OutageDetailsParser(StubAddressParser())
+    records = [
+        ParsedRecord(
+            area=area,
+            organization=organization_parser.parse(organization),
+            details=await outage_parser.parse(address),
+            dates=parse_dates(dates),
+        )
+        for area, organization, address, dates in table
+    ]
+
+    async def parse_all_dates():
+        return [parse_dates(text) for text in dates_text]
+
+    async def format_all_dates():
+        return [format_dates(value) for value in dates]
+
+    async def parse_organizations():
+        return [
+            organization_parser.parse(organization) for _, organization, _, _ in table
+        ]
+
+    async def parse_details():
+        return [await outage_parser.parse(address) for _, _, address, _ in table]
+
+    async def empty_storage() -> Storage:
+        return Storage(FakeRedis(), "bench", TTL)
+
+    async def filled_storage() -> Storage:
+        storage = await empty_storage()
+        await storage.commit(records)
+        return storage
+
+    def storage_case(name: str, make: Callable[[], Awaitable[Storage]], method: str):
+        async def prepare() -> Run:
+            storage = await make()
+            return lambda: getattr(storage, method)(records)
+
+        return Case(name, len(records), prepare)
+
+    async def publisher() -> Publisher:
+        return Publisher(FakeRedis(), "bench")
+
+    async def prepare_publish() -> Run:
+        p = await publisher()
+
+        async def run():
+            return [await p.publish(record) for record in records]
+
+        return run
+
+    async def prepare_publish_many() -> Run:
+        p = await publisher()
+        return lambda: p.publish_many(records)
+
+    return [
+        scraper_case("scraper.run/fixture", fixture, len(extract_rows(fixture))),
+        scraper_case("scraper.run/synthetic", synthetic, len(table)),
+        Case("dates.parse", len(dates_text), static(parse_all_dates)),
+        Case("dates.format", len(dates), static(format_all_dates)),
+        Case("organization.parse", len(table), static(parse_organizations)),
+        Case("outage_details.parse", len(table), static(parse_details)),
+        storage_case("storage.diff/empty", empty_storage, "diff"),
+        storage_case("storage.diff/stored", filled_storage, "diff"),
+        storage_case("storage.commit", empty_storage, "commit"),
+        Case("publisher.publish", len(records), prepare_publish),
+        Case("publisher.publish_many", len(records), prepare_publish_many),
+    ]
+
+
+async def measure(case: Case, repeat: int) -> dict:
+    # One warmup run
+    await (await case.prepare())()
+
+    timings = []
+    for _ in range(repeat):
+        run = await case.prepare()
+        start = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - start)
+
+    median = statistics.median(timings)
+    return {
+        "items": case.items,
+        "repeat": repeat,
+        "min_s": min(timings),
+        "median_s": median,
+        "mean_s": statistics.fmean(timings),
+        "stdev_s": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "per_item_us": median / max(case.items, 1) * 1e6,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, baseline: dict | None):
+    print(f"{'case':<26} {'items':>6} {'median, ms':>11} {'per item, us':>13}", end="")
+    print(f" {'baseline, us':>13} {'change':>8}" if baseline else "")
+    for name, result in results.items():
+        line = (
+            f"{name:<26} {result['items']:>6} {result['median_s'] * 1000:11.2f}"
+            f" {result['per_item_us']:13.2f}"
+        )
+        if baseline:
+            before = baseline["results"].get(name)
+            if before:
+                change = result["per_item_us"] / before["per_item_us"] - 1
+                line += f" {before['per_item_us']:13.2f} {change:+8.1%}"
+            else:
+                line += f" {'-':>13} {'-':>8}"
+        print(line)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--filter", default=None, help="regex of the case names")
+    parser.add_argument("--output", default=None, help="JSON file, - for stdout")
+    parser.add_argument("--compare", default=None, help="JSON file of a previous run")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    cases = await build_cases(args.rows, args.seed)
+    if args.filter:
+        cases = [case for case in cases if re.search(args.filter, case.name)]
+
+    results = {case.name: await measure(case, args.repeat) for case in cases}
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rows": args.rows,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_results(results, baseline)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,5 +1,13 @@
 import os
 import sys
 
+import pytest
+from fakeredis import FakeAsyncRedis
+
 # Adjust sys.path to include the repository root directory
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+
+@pytest.fixture
+def r() -> FakeAsyncRedis:
+    return FakeAsyncRedis(decode_responses=True)
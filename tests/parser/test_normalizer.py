@@ -0,0 +1,117 @@
+import pytest
+
+from app.parser.normalizer import CachedNormalizer, StreetMatch
+
+
+class AddressParser:
+    """Address parser stub counting the normalized names"""
+
+    def __init__(self, matches: dict[str, StreetMatch | None]):
+        self.matches = matches
+        self.calls: list[str] = []
+
+    async def normalize(self, street_name: str) -> StreetMatch | None:
+        self.calls.append(street_name)
+        return self.matches.get(street_name)
+
+
+MATCHES = {
+    "Ленина": StreetMatch(name="улица Ленина", confidence=0.9),
+    "Кольцевая": StreetMatch(name="Кольцевая улица", confidence=0.4),
+}
+
+
+def make_normalizer(address_parser, r, version: str = "1.0") -> CachedNormalizer:
+    return CachedNormalizer(
+        address_parser,  # type: ignore[arg-type]
+        r,
+        prefix="bot-005",
+        ttl=3600,
+        cache_size=16,
+        version=version,
+    )
+
+
+@pytest.mark.asyncio
+async def test_names_are_parsed_once_in_process(r):
+    address_parser = AddressParser(MATCHES)
+    normalizer = make_normalizer(address_parser, r)
+
+    for _ in range(2):
+        assert await normalizer.normalize_many(["Ленина", "Кольцевая", "Ленина"]) == {
+            "Ленина": MATCHES["Ленина"],
+            "Кольцевая": MATCHES["Кольцевая"],
+        }
+
+    assert address_parser.calls == ["Ленина", "Кольцевая"]
+    assert (normalizer.cache.hits, normalizer.cache.misses) == (2, 2)
+    assert (normalizer.redis_hits, normalizer.redis_misses) == (0, 2)
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_is_shared_and_expires_per_field(r):
+    await make_normalizer(AddressParser(MATCHES), r).normalize_many(["Ленина", "Весны"])
+
+    address_parser = AddressParser(MATCHES)
+    normalizer = make_normalizer(address_parser, r)
+    # A rejected name is cached as well
+    assert await normalizer.normalize_many(["Ленина", "Весны"]) == {
+        "Ленина": MATCHES["Ленина"],
+        "Весны": None,
+    }
+
+    assert address_parser.calls == []
+    assert normalizer.redis_hits == 2
+    assert await r.hget("bot-005:streets:1.0", "Весны") == "null"
+    assert all(
+        0 < ttl <= 3600
+        for ttl in await r.httl("bot-005:streets:1.0", "Ленина", "Весны")
+    )
+
+
+@pytest.mark.asyncio
+async def test_new_parser_version_starts_empty(r):
+    await make_normalizer(AddressParser(MATCHES), r, version="1.0").normalize("Ленина")
+
+    address_parser = AddressParser(MATCHES)
+    normalizer = make_normalizer(address_parser, r, version="1.1")
+    assert await normalizer.normalize("Ленина") == MATCHES["Ленина"]
+
+    assert address_parser.calls == ["Ленина"]
+    assert await r.hkeys("bot-005:streets:1.1") == ["Ленина"]
+
+
+@pytest.mark.asyncio
+async def test_batch_takes_one_read_and_one_write(r, monkeypatch):
+    await make_normalizer(AddressParser(MATCHES), r).normalize("Ленина")
+
+    commands = []
+    for name in ("hmget", "hget", "pipeline"):
+        method = getattr(r, name)
+
+        def record(*args, name=name, method=method, **kwargs):
+            commands.append(name)
+            return method(*args, **kwargs)
+
+        monkeypatch.setattr(r, name, record)
+
+    address_parser = AddressParser(MATCHES)
+    normalizer = make_normalizer(address_parser, r)
+    await normalizer.normalize_many(["Ленина", "Кольцевая", "Весны"])
+
+    assert commands == ["hmget", "pipeline"]
+    assert address_parser.calls == ["Кольцевая", "Весны"]
+
+
+class BrokenRedis:
+    def __getattr__(self, name):
+        raise ConnectionError("Redis is down")
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_fall_back_to_parser():
+    address_parser = AddressParser(MATCHES)
+    normalizer = make_normalizer(address_parser, BrokenRedis())
+
+    assert await normalizer.normalize("Ленина") == MATCHES["Ленина"]
+    assert address_parser.calls == ["Ленина"]
@@ -1,7 +1,10 @@
+import asyncio
+
 from address_parser import AddressParser
 import pytest
 import pytest_asyncio
 
+from app.parser.normalizer import StreetMatch
 from app.parser.outage_details import (
     OutageDetails,
     OutageDetailsParser,
@@ -250,6 +253,53 @@ async def test_partial_input(parser):
     assert result.water_deliveries is None
 
 
+@pytest.mark.asyncio
+async def test_parse_resolved_matches_parse(parser):
+    input_string = (
+        "Кольцевая 9 (4 подъезд, 5-й этаж); ул. Ленина 1, 2;\n"
+        "аварийное - причина выясняется\n"
+        "Подвоз воды: Кольцевая 9 с 10:00 до 18:00"
+    )
+    resolved = await parser.resolve(parser.street_names(input_string))
+
+    assert OutageDetailsParser.parse_resolved(
+        input_string, resolved
+    ) == await parser.parse(input_string)
+
+
+class SlowNormalizer:
+    """Address parser stub counting the normalizations in flight"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def normalize(self, street_name: str) -> StreetMatch:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return StreetMatch(name=f"улица {street_name}", confidence=1.0)
+
+
+@pytest.mark.asyncio
+async def test_normalizations_are_bounded():
+    normalizer = SlowNormalizer()
+    parser = OutageDetailsParser(normalizer, concurrency=2)  # type: ignore[arg-type]
+
+    result = await parser.parse("Ленина 1; Мира 2; Кольцевая 9; Весны 3; Урванцева 5")
+
+    assert normalizer.max_in_flight == 2
+    assert [street.name for street in result.streets] == [
+        "улица Ленина",
+        "улица Мира",
+        "улица Кольцевая",
+        "улица Весны",
+        "улица Урванцева",
+    ]
+
+
 # def test_malformed_input(parser):
 #     input_string = "Invalid format"
 #     result = parser.parse(input_string)
@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+
+from app.parser.table import TableRowExtractor
+
+FIXTURE = Path(__file__).parent.parent / "fixtures" / "Gorod.htm"
+
+EXPECTED_ROWS = [
+    (
+        "Железнодорожный район",
+        "Горячее водоснабжение\nАО КТТК\nт. 264-18-62\nт. 214-93-51",
+        "Вильского 4а, 6а; Петра Словцова 2, 8; Гусарова 2, 13;\nаварийное - подстанция Радиотехническая фидер 126-01, повреждение кабельной линии",
+        "с 18 октября 09-00до 18 октября 24-00",
+    ),
+    (
+        "Железнодорожный район",
+        "Электроснабжение\nПАО Россети Сибирь\nт. 8-800-220-0-220",
+        "Мира 60 (Дом быта);\nплановое - замена опоры",
+        "19 октября 10:00 - 19 октября 17:00",
+    ),
+    (
+        "Октябрьский район",
+        "Горячее водоснабжение с подающего трубопровода\nООО СибЭР (№ 980)\nт. 214-93-51",
+        "Красноярский рабочий 173а;\nКольцевая 10а, 10б, 12, 12а (школа), 14, 16, 18;\nплановое - переврезка подающего трубопровода на постоянную схему\nПодвоз воды: ул. Ленина 1 с 10:00 до 18:00",
+        "21 октября 09-00 — 23 октября 21-00",
+    ),
+    (
+        "Октябрьский район",
+        "Теплоснабжение\nАО «Енисейская ТГК»\nт. 274-05-05",
+        "Мате Залки; Космонавтов; Харламова;\nаварийное - причина выясняется",
+        "22 октября 13-0022 октября 20-30",
+    ),
+]
+
+
+def extract(data: bytes, chunk_size: int) -> list[tuple[str, str, str, str]]:
+    extractor = TableRowExtractor(encoding="windows-1251")
+    rows = []
+    for i in range(0, len(data), chunk_size):
+        rows.extend(extractor.feed_bytes(data[i : i + chunk_size]))
+    rows.extend(extractor.close())
+    return rows
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 512, 1 << 20])
+def test_fixture_rows(chunk_size):
+    assert extract(FIXTURE.read_bytes(), chunk_size) == EXPECTED_ROWS
+
+
+def test_rows_are_emitted_when_closed():
+    extractor = TableRowExtractor(encoding="utf-8")
+    area = "<table><tr><td></td><td>Кировский район</td><td></td></tr>"
+    row = "<tr><td>Электроснабжение<br>ПАО</td><td>Мира 1</td><td>1 мая 10-00</td>"
+
+    assert extractor.feed_bytes(area.encode()) == []
+    assert extractor.feed_bytes(row.encode()) == []
+    assert extractor.feed_bytes(b"</tr>") == [
+        ("Кировский район", "Электроснабжение\nПАО", "Мира 1", "1 мая 10-00")
+    ]
+    assert extractor.close() == []
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        # Rows before the first area header
+        "<table><tr><td>a</td><td>b</td><td>c</td></tr></table>",
+        # Rows with an empty cell
+        "<table><tr><td></td><td>Кировский район</td><td></td></tr>"
+        "<tr><td>a</td><td> </td><td>c</td></tr></table>",
+        # Rows outside of the first table
+        "<table></table><table><tr><td></td><td>Кировский район</td><td></td></tr>"
+        "<tr><td>a</td><td>b</td><td>c</td></tr></table>",
+    ],
+)
+def test_skipped_rows(html):
+    extractor = TableRowExtractor(encoding="utf-8")
+    assert extractor.feed_bytes(html.encode()) + extractor.close() == []
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import pytest
+
+from app.parser.utils import format_dates, parse_dates
+
+YEAR = datetime.now().year
+
+
+@pytest.mark.parametrize(
+    "input_string, expected",
+    [
+        (
+            "18 октября 09-00 18 октября 17-00",
+            [datetime(YEAR, 10, 18, 9, 0), datetime(YEAR, 10, 18, 17, 0)],
+        ),
+        (
+            "с 1 мая 10:30 до 2 Мая 24-00",
+            [datetime(YEAR, 5, 1, 10, 30), datetime(YEAR, 5, 2, 23, 59)],
+        ),
+        ("5 январь 08-00", [datetime(YEAR, 1, 5, 8, 0)]),
+        ("без даты", []),
+    ],
+)
+def test_parse_dates(input_string, expected):
+    assert parse_dates(input_string) == expected
+
+
+def test_parse_dates_unknown_month():
+    with pytest.raises(ValueError):
+        parse_dates("18 october 09-00")
+
+
+def test_format_dates():
+    dates = [datetime(2025, 3, 1, 9, 0), datetime(2025, 12, 31, 23, 59)]
+    assert format_dates(dates) == "01 марта 09-00 31 декабря 23-59"
+
+
+def test_format_parse_roundtrip():
+    dates = [datetime(YEAR, month, 10, 12, 15) for month in range(1, 13)]
+    assert parse_dates(format_dates(dates)) == dates
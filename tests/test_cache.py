@@ -0,0 +1,34 @@
+from app.cache import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache: LRUCache[str, int] = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_counts_hits_and_misses():
+    cache: LRUCache[str, int] = LRUCache(2)
+    cache.put("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate == 0.5
+
+
+def test_zero_size_disables_cache():
+    cache: LRUCache[str, int] = LRUCache(0)
+    cache.put("a", 1)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
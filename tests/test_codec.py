@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+from apis.models import (
+    OrganizationInfo,
+    OutageDetails,
+    Reason,
+    ResourceType,
+    Street,
+    WaterDelivery,
+)
+
+from app.codec import COMPRESS_THRESHOLD, decode_record, digest, encode_record
+from app.publisher import ParsedRecord
+
+
+def make_record(comments: str | None = None) -> ParsedRecord:
+    return ParsedRecord(
+        area="Кировский район",
+        organization=OrganizationInfo(
+            resource_type=ResourceType.HOT_WATER,
+            resource="Горячее водоснабжение",
+            organization="АО КТТК",
+            phones=["205-05-00"],
+        ),
+        details=OutageDetails(
+            streets=[
+                Street(name="улица Ленина", buildings=["1", "3а"]),
+                Street(name="улица Мира"),
+            ],
+            reason=Reason(type="плановое", description="ремонт"),
+            water_deliveries=[
+                WaterDelivery(
+                    street="Ленина", buildings="1", time_start="10:00", time_end="12:00"
+                )
+            ],
+            comments=comments,
+        ),
+        dates=[datetime(2025, 6, 1, 9), datetime(2025, 6, 2, 23, 59)],
+    )
+
+
+@pytest.mark.parametrize(
+    "comments", [None, "", "Подвоз воды", "Подвоз воды. " * COMPRESS_THRESHOLD]
+)
+def test_roundtrip(comments):
+    record = make_record(comments)
+
+    encoded = encode_record(record)
+
+    assert decode_record(encoded) == record
+    assert len(encoded) < len(record.model_dump_json().encode())
+
+
+def test_decodes_json():
+    record = make_record("Подвоз воды")
+
+    assert decode_record(record.model_dump_json()) == record
+    assert decode_record(record.model_dump_json().encode()) == record
+
+
+def test_rejects_unknown_version():
+    encoded = encode_record(make_record())
+
+    with pytest.raises(ValueError):
+        decode_record(b"\xff" + encoded[1:])
+
+
+def test_digest_is_64_bit():
+    assert len(digest("улица Ленина", "плановое")) == 8
+    assert digest("a", "b") != digest("ab", "")
+
+
+def test_separator_in_value_is_stored_as_json():
+    record = make_record("Подвоз\x1fводы")
+
+    encoded = encode_record(record)
+
+    assert encoded[:1] == b"{"
+    assert decode_record(encoded) == record
+
+
+def test_roundtrip_many_buildings():
+    record = make_record()
+    record.details.streets[0].buildings = [str(i) for i in range(300)]
+
+    assert decode_record(encode_record(record)) == record
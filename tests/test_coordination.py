@@ -0,0 +1,257 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from apis.models import OrganizationInfo, OutageDetails, ResourceType, Street
+
+from app.coordination import LeaderLease, WorkQueue
+from app.metrics import Metrics
+from app.parser.organization import OrganizationParser
+from app.publisher import ParsedRecord, Publisher
+from app.scheduler import PeriodicTask, ShardWorker
+from app.scraper import Record
+from app.storage import Storage
+
+
+def make_record(area: str, address: str) -> Record:
+    return Record(
+        area=area,
+        organization="Горячее водоснабжение\nАО КТТК\nт. 205-05-00",
+        address=address,
+        dates=[datetime(2025, 6, 1, 9), datetime(2025, 6, 2, 23, 59)],
+    )
+
+
+@pytest.mark.asyncio
+async def test_lease_is_held_by_one_replica(r):
+    first = LeaderLease(r, "bot-005:leader", "first", ttl=30)
+    second = LeaderLease(r, "bot-005:leader", "second", ttl=30)
+
+    assert await first.acquire()
+    assert not await second.acquire()
+    # Renewed by the holder
+    assert await first.acquire()
+    assert first.is_leader and not second.is_leader
+
+    await first.stop()
+    assert not first.is_leader
+    assert await second.acquire()
+
+
+@pytest.mark.asyncio
+async def test_queue_shards_records_by_area(r):
+    leader = WorkQueue(r, "bot-005:work", "first")
+    await leader.setup()
+    await leader.put(
+        [
+            make_record("Кировский район", "ул. Ленина 1"),
+            make_record("Ленинский район", "ул. Мира 2"),
+            make_record("Кировский район", "ул. Ленина 3"),
+        ]
+    )
+
+    first = await leader.get(block=0.01)
+    second = await WorkQueue(r, "bot-005:work", "second").get(block=0.01)
+    assert [len(records) for _, records in first + second] == [2, 1]
+    assert {records[0].area for _, records in first + second} == {
+        "Кировский район",
+        "Ленинский район",
+    }
+
+    await leader.ack(first[0][0])
+    # Not acknowledged by the second replica, claimed again once idle
+    stale = await WorkQueue(r, "bot-005:work", "third", claim_idle=0).get()
+    assert stale == second
+
+
+class Task:
+    def __init__(self, results: list[str]):
+        self.results = results
+        self.metrics = Metrics()
+        self.profiler = None
+        self.processed: list[list[Record]] = []
+
+    async def process(self, records: list[Record]) -> str:
+        self.processed.append(records)
+        return self.results.pop(0)
+
+
+class Queue:
+    def __init__(self, entries: list[tuple[str, list[Record]]]):
+        self.entries = entries
+        self.acked: list[str] = []
+
+    async def get(self):
+        entries, self.entries = self.entries, []
+        return entries
+
+    async def ack(self, *entry_ids: str):
+        self.acked.extend(entry_ids)
+
+
+@pytest.mark.asyncio
+async def test_shard_worker_leaves_failed_entries_pending():
+    task = Task(["ok", "error", "partial"])
+    queue = Queue(
+        [
+            ("1-0", [make_record("Кировский район", "ул. Ленина 1")]),
+            ("2-0", [make_record("Ленинский район", "ул. Мира 2")]),
+            ("3-0", [make_record("Октябрьский район", "ул. Весны 3")]),
+        ]
+    )
+
+    await ShardWorker(task, queue).run()  # type: ignore[arg-type]
+
+    assert len(task.processed) == 3
+    assert queue.acked == ["1-0"]
+
+
+def make_outage() -> ParsedRecord:
+    return ParsedRecord(
+        area="Кировский район",
+        organization=OrganizationInfo(
+            resource_type=ResourceType.HOT_WATER,
+            resource="Горячее водоснабжение",
+            organization="АО КТТК",
+            phones=["205-05-00"],
+        ),
+        details=OutageDetails(streets=[Street(name="улица Ленина")]),
+        dates=[datetime(2025, 6, 1, 9)],
+    )
+
+
+@pytest.mark.asyncio
+async def test_publisher_sends_message_once(r):
+    outage = make_outage()
+    # Two replicas processing the same area after a failover
+    replicas = [
+        Publisher(r, "bot-005", modes=["stream"], idempotency_ttl=60, claim_ttl=0.05)
+        for _ in range(2)
+    ]
+
+    assert await replicas[0].publish_many([outage]) == [True]
+    # Still skipped once the claim TTL has passed
+    await asyncio.sleep(0.1)
+    assert await replicas[1].publish_many([outage]) == [True]
+    assert await r.xlen("bot-005:outages:stream") == 1
+
+
+@pytest.mark.asyncio
+async def test_publisher_claim_expires_if_not_sent(r):
+    outage = make_outage()
+    replicas = [
+        Publisher(r, "bot-005", modes=["stream"], idempotency_ttl=60, claim_ttl=0.05)
+        for _ in range(2)
+    ]
+    messages = [replicas[0]._serialize(outage)]
+
+    # The first replica dies after claiming the message
+    assert await replicas[0]._claim(messages) == [None]
+    # Not published yet, so not committed and processed again
+    assert await replicas[1].publish_many([outage]) == [False]
+    assert await r.xlen("bot-005:outages:stream") == 0
+
+    await asyncio.sleep(0.1)
+    assert await replicas[1].publish_many([outage]) == [True]
+    assert await r.xlen("bot-005:outages:stream") == 1
+    # Kept for the full TTL once sent
+    assert await r.ttl(replicas[1]._key(messages[0])) > 1
+
+
+class OutageParser:
+    def street_names(self, address: str) -> set[str]:
+        return set()
+
+    async def resolve(self, street_names):
+        return {}
+
+    async def parse(self, address: str, resolved=None) -> OutageDetails:
+        return OutageDetails(streets=[Street(name=address)])
+
+
+class Scraper:
+    source = None
+
+
+class Replica:
+    """Shard worker of one replica with the real publisher and storage"""
+
+    CLAIM_IDLE = 0.2
+
+    def __init__(self, r, name: str):
+        self.queue = WorkQueue(r, "bot-005:work", name, claim_idle=self.CLAIM_IDLE)
+        self.storage = Storage(r, "bot-005", ttl=3600)
+        # As configured in `main`
+        self.publisher = Publisher(
+            r,
+            "bot-005",
+            modes=["stream"],
+            idempotency_ttl=3600,
+            claim_ttl=self.CLAIM_IDLE / 2,
+        )
+        self.task = PeriodicTask(
+            scraper=Scraper(),  # type: ignore[arg-type]
+            storage=self.storage,
+            publisher=self.publisher,
+            outage_parser=OutageParser(),  # type: ignore[arg-type]
+            organization_parser=OrganizationParser(),
+            interval=60,
+            metrics=Metrics(),
+        )
+        self.worker = ShardWorker(self.task, self.queue)
+
+    async def die_after_claiming(self, delay: float = 0.0):
+        """Reads the entry and claims its outages, but never sends them"""
+        [(_, records)] = await self.queue.get(block=0.01)
+        await asyncio.sleep(delay)
+        outages = [await self.task._fill_details(record) for record in records]
+        await self.publisher._claim(
+            [self.publisher._serialize(outage) for outage in outages]
+        )
+        return outages
+
+
+async def pending(r) -> int:
+    return (await r.xpending("bot-005:work", WorkQueue.GROUP))["pending"]
+
+
+@pytest_asyncio.fixture
+async def replicas(r):
+    dead, alive = Replica(r, "first"), Replica(r, "second")
+    await dead.queue.setup()
+    await dead.queue.put([make_record("Кировский район", "ул. Ленина 1")])
+    return dead, alive
+
+
+@pytest.mark.asyncio
+async def test_outage_claimed_by_dead_replica_is_taken_over(r, replicas):
+    dead, alive = replicas
+    outages = await dead.die_after_claiming(delay=Replica.CLAIM_IDLE * 0.25)
+
+    # Taken over once idle, the claim set after the delivery has expired
+    await asyncio.sleep(Replica.CLAIM_IDLE * 0.75)
+    await alive.worker.run()
+
+    assert await r.xlen("bot-005:outages:stream") == 1
+    assert await alive.storage.diff(outages) == []
+    assert await pending(r) == 0
+
+
+@pytest.mark.asyncio
+async def test_area_with_outage_still_claimed_stays_pending(r, replicas):
+    dead, alive = replicas
+    # Parsing took so long the claim outlives the entry idle time
+    outages = await dead.die_after_claiming(delay=Replica.CLAIM_IDLE * 0.75)
+
+    await asyncio.sleep(Replica.CLAIM_IDLE * 0.25)
+    await alive.worker.run()
+    assert await r.xlen("bot-005:outages:stream") == 0
+    assert await pending(r) == 1
+
+    # Claimed again once idle, after the claim of the dead replica expired
+    await asyncio.sleep(Replica.CLAIM_IDLE)
+    await alive.worker.run()
+    assert await r.xlen("bot-005:outages:stream") == 1
+    assert await alive.storage.diff(outages) == []
+    assert await pending(r) == 0
@@ -0,0 +1,29 @@
+import pytest
+
+from app.executor import Executor
+from app.similarity import find_similar
+
+
+@pytest.mark.asyncio
+async def test_map_keeps_order_across_workers():
+    executor = Executor(workers=2)
+    try:
+        items = ["a" * i for i in range(10)]
+        assert await executor.map(len, items) == list(range(10))
+        assert await executor.run(sum, [1, 2, 3]) == 6
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_runs_inline_without_workers():
+    executor = Executor()
+
+    matches = await executor.run(
+        find_similar,
+        [("улица Ленина 1, 2", 1), ("проспект Мира 3", 2)],
+        [("улица Ленина 1, 3", 1), ("улица Ленина 1, 3", 2)],
+    )
+
+    assert matches[0] is not None and matches[0][0] == 0
+    assert matches[1] is None
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from app.metrics import Counter, Histogram, Metrics, MetricsServer
+
+
+def test_counter_exposes_labels():
+    counter = Counter("records_total", "Records")
+    counter.inc(2, outcome="scraped")
+    counter.inc(outcome="scraped")
+
+    assert counter.expose() == [
+        "# HELP records_total Records",
+        "# TYPE records_total counter",
+        'records_total{outcome="scraped"} 3',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("duration_seconds", "Duration", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value, stage="diff")
+
+    lines = histogram.expose()
+
+    assert 'duration_seconds_bucket{stage="diff",le="0.1"} 1' in lines
+    assert 'duration_seconds_bucket{stage="diff",le="1"} 3' in lines
+    assert 'duration_seconds_bucket{stage="diff",le="+Inf"} 4' in lines
+    assert 'duration_seconds_count{stage="diff"} 4' in lines
+
+
+@pytest.mark.asyncio
+async def test_server_serves_metrics():
+    metrics = Metrics()
+    metrics.records.inc(outcome="changed")
+    server = MetricsServer(metrics, "127.0.0.1", 0)
+    await server.start()
+    try:
+        port = server._server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = (await reader.read()).decode()
+        writer.close()
+    finally:
+        await server.stop()
+
+    assert response.startswith("HTTP/1.0 200 OK")
+    assert 'monitor_records_total{outcome="changed"} 1' in response
@@ -0,0 +1,81 @@
+import os
+import time
+import tracemalloc
+
+from app.profiling import CycleProfiler
+
+
+def busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_profiles_requested_cycles(tmp_path):
+    profiler = CycleProfiler(str(tmp_path))
+    profiler.profile_next(1)
+
+    for _ in range(2):
+        with profiler.cycle():
+            busy(0.01)
+
+    files = os.listdir(tmp_path)
+    assert len(files) == 1
+    assert files[0].startswith("cycle-") and files[0].endswith(".prof")
+
+
+def test_dumps_slow_cycle_stacks(tmp_path):
+    profiler = CycleProfiler(str(tmp_path), slow_cycle=0.05, sample_interval=0.001)
+    try:
+        with profiler.cycle():
+            busy(0.001)
+        with profiler.cycle():
+            busy(0.1)
+    finally:
+        profiler.close()
+
+    files = os.listdir(tmp_path)
+    assert len(files) == 1 and files[0].startswith("slow-")
+    with open(tmp_path / files[0]) as f:
+        assert "busy (test_profiling.py" in f.read()
+
+
+def test_toggles_tracemalloc(tmp_path):
+    profiler = CycleProfiler(str(tmp_path))
+    profiler.toggle_tracemalloc()
+    try:
+        assert tracemalloc.is_tracing()
+        for _ in range(2):
+            with profiler.cycle():
+                pass
+        assert profiler._snapshot is not None
+    finally:
+        profiler.toggle_tracemalloc()
+
+    assert not tracemalloc.is_tracing()
+
+
+def test_profilers_share_tracemalloc(tmp_path, caplog):
+    caplog.set_level("INFO", "app.profiling")
+    first = CycleProfiler(str(tmp_path / "a"), tracemalloc_frames=5)
+    second = CycleProfiler(str(tmp_path / "b"), tracemalloc_frames=5)
+    try:
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_traceback_limit() == 5
+        for _ in range(2):
+            with second.cycle():
+                pass
+        assert "Traced memory" in caplog.text
+
+        # Restarted by another profiler, the old snapshot is not compared
+        first.toggle_tracemalloc()
+        first.toggle_tracemalloc()
+        caplog.clear()
+        with second.cycle():
+            pass
+        assert "Traced memory" not in caplog.text
+        assert tracemalloc.get_traceback_limit() == 5
+    finally:
+        first.toggle_tracemalloc()
+
+    assert not tracemalloc.is_tracing()
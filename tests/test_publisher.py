@@ -0,0 +1,106 @@
+import json
+from datetime import datetime
+
+import pytest
+from apis.models import OrganizationInfo, OutageDetails, ResourceType, Street
+
+from app.publisher import MODE_PUBSUB, MODE_STREAM, ParsedRecord, Publisher
+
+
+def make_outage(street: str) -> ParsedRecord:
+    return ParsedRecord(
+        area="Кировский район",
+        organization=OrganizationInfo(
+            resource_type=ResourceType.HOT_WATER,
+            resource="Горячее водоснабжение",
+            organization="АО КТТК",
+            phones=["205-05-00"],
+        ),
+        details=OutageDetails(streets=[Street(name=street)]),
+        dates=[datetime(2025, 6, 1, 9)],
+    )
+
+
+def fail_publish(r, times: int):
+    """Makes the first `times` PUBLISH commands queued in pipelines fail"""
+    pipeline = r.pipeline
+    sent: list[str] = []
+
+    def failing_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        publish = pipe.publish
+
+        def failing_publish(channel, message):
+            sent.append(message)
+            if len(sent) <= times:
+                # Wrong number of arguments
+                return pipe.execute_command("PUBLISH", channel)
+            return publish(channel, message)
+
+        pipe.publish = failing_publish
+        return pipe
+
+    r.pipeline = failing_pipeline
+    return sent
+
+
+def test_unknown_modes_are_rejected(r):
+    with pytest.raises(ValueError, match="queue"):
+        Publisher(r, "bot-005", modes=[MODE_STREAM, "queue"])
+
+
+@pytest.mark.asyncio
+async def test_stream_mode_appends_messages(r):
+    publisher = Publisher(r, "bot-005", modes=[MODE_STREAM])
+
+    assert await publisher.publish_many(
+        [make_outage("улица Ленина"), make_outage("улица Мира")]
+    ) == [True, True]
+
+    entries = await r.xrange("bot-005:outages:stream")
+    assert [
+        json.loads(fields["outage"])["details"]["streets"][0]["name"]
+        for _, fields in entries
+    ] == ["улица Ленина", "улица Мира"]
+
+
+@pytest.mark.asyncio
+async def test_stream_is_trimmed(r):
+    publisher = Publisher(r, "bot-005", modes=[MODE_STREAM], stream_maxlen=10)
+
+    await publisher.publish_many([make_outage(f"улица {i}") for i in range(300)])
+
+    # Trimmed approximately, by whole stream nodes
+    assert 10 <= await r.xlen("bot-005:outages:stream") < 300
+
+
+@pytest.mark.asyncio
+async def test_setup_creates_consumer_group_once(r):
+    publisher = Publisher(r, "bot-005", modes=[MODE_STREAM], stream_group="bot")
+
+    await publisher.setup()
+    # Another instance or a restart finds the group in place
+    await publisher.setup()
+
+    groups = await r.xinfo_groups("bot-005:outages:stream")
+    assert [group["name"] for group in groups] == ["bot"]
+
+
+@pytest.mark.asyncio
+async def test_setup_without_group_creates_nothing(r):
+    await Publisher(r, "bot-005", modes=[MODE_PUBSUB, MODE_STREAM]).setup()
+
+    assert not await r.exists("bot-005:outages:stream")
+
+
+@pytest.mark.asyncio
+async def test_retry_sends_only_failed_mode(r):
+    publisher = Publisher(r, "bot-005", modes=[MODE_PUBSUB, MODE_STREAM])
+    sent = fail_publish(r, times=1)
+    outages = [make_outage("улица Ленина"), make_outage("улица Мира")]
+
+    assert await publisher.publish_many(outages) == [False, True]
+    assert await publisher.publish_many(outages[:1]) == [True]
+
+    assert len(sent) == 3
+    assert await r.xlen("bot-005:outages:stream") == 2
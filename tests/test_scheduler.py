@@ -0,0 +1,305 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from apis.models import OutageDetails, Street
+
+from app.metrics import Metrics
+from app.parser.normalizer import CachedNormalizer, StreetMatch
+from app.parser.organization import OrganizationParser
+from app.parser.outage_details import OutageDetailsParser
+from app.publisher import Publisher as RedisPublisher
+from app.storage import Storage as RedisStorage
+from app.scheduler import PeriodicTask, Schedule
+from app.scraper import Record
+
+
+class Clock:
+    def __init__(self):
+        self.time = 1000.0
+
+    def __call__(self) -> float:
+        return self.time
+
+
+def test_deadlines_do_not_drift():
+    clock = Clock()
+    schedule = Schedule(60, clock=clock)
+
+    delays = []
+    for cycle_time in (5, 20, 1):
+        clock.time += cycle_time
+        delay = schedule.advance(changed=False)
+        delays.append(delay)
+        clock.time += delay
+
+    assert delays == [55, 40, 59]
+    assert clock.time == 1000 + 3 * 60
+
+
+def test_long_cycle_skips_missed_deadlines():
+    clock = Clock()
+    schedule = Schedule(60, clock=clock)
+
+    clock.time += 150
+    assert schedule.advance(changed=False) == 0
+    assert schedule.advance(changed=False) == 60
+
+
+def test_backs_off_until_changed():
+    clock = Clock()
+    schedule = Schedule(
+        60,
+        min_interval=30,
+        max_interval=120,
+        backoff=2,
+        clock=clock,
+        now=lambda: datetime(2024, 1, 1, 3),
+    )
+
+    intervals = []
+    for changed in (False, False, False, True, False):
+        schedule.advance(changed)
+        intervals.append(schedule.interval)
+
+    assert intervals == [120, 120, 120, 30, 60]
+
+
+def test_busy_hours_use_min_interval():
+    schedule = Schedule(
+        300,
+        min_interval=60,
+        busy_hours=[(8, 11)],
+        clock=Clock(),
+        now=lambda: datetime(2024, 1, 1, 9, 30),
+    )
+
+    schedule.advance(changed=False)
+
+    assert schedule.interval == 60
+
+
+class SlowParser:
+    """Outage parser stub, the first records take the longest to parse"""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def street_names(self, address: str) -> set[str]:
+        return {address}
+
+    async def resolve(self, street_names):
+        raise RuntimeError("address parser is down")
+
+    async def parse(self, address: str, resolved=None) -> OutageDetails:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.005 * (self.count - int(address)))
+        self.in_flight -= 1
+        return OutageDetails(streets=[Street(name=address)])
+
+
+class Storage:
+    def __init__(self):
+        self.diffed: list = []
+        self.committed: list = []
+
+    async def diff(self, records):
+        self.diffed = records
+        return records
+
+    async def commit(self, records):
+        self.committed = records
+
+
+class Publisher:
+    def __init__(self):
+        self.published: list = []
+
+    async def publish_many(self, outages):
+        self.published.extend(outages)
+        return [True] * len(outages)
+
+
+class Scraper:
+    source = None
+
+
+def make_task(outage_parser, storage, publisher, concurrency: int = 8):
+    return PeriodicTask(
+        scraper=Scraper(),  # type: ignore[arg-type]
+        storage=storage,
+        publisher=publisher,
+        outage_parser=outage_parser,
+        organization_parser=OrganizationParser(),
+        interval=60,
+        concurrency=concurrency,
+        metrics=Metrics(),
+    )
+
+
+def make_records(count: int) -> list[Record]:
+    return [make_record(str(i)) for i in range(count)]
+
+
+def make_record(address: str) -> Record:
+    return Record(
+        area="Кировский район",
+        organization="Горячее водоснабжение\nАО КТТК\nт. 264-18-62",
+        address=address,
+        dates=[datetime(2025, 6, 1, 9)],
+    )
+
+
+@pytest.mark.asyncio
+async def test_details_are_filled_with_bounded_concurrency_in_order():
+    outage_parser = SlowParser(6)
+    storage = Storage()
+    task = make_task(outage_parser, storage, Publisher(), concurrency=2)
+
+    assert await task.process(make_records(6)) == "ok"
+
+    assert outage_parser.max_in_flight == 2
+    assert [r.details.streets[0].name for r in storage.diffed] == [
+        str(i) for i in range(6)
+    ]
+
+
+class AddressParser:
+    def __init__(self):
+        self.calls: list[str] = []
+
+    async def normalize(self, street_name: str) -> StreetMatch:
+        self.calls.append(street_name)
+        return StreetMatch(name=f"улица {street_name}", confidence=0.9)
+
+
+@pytest.mark.asyncio
+async def test_unique_streets_are_normalized_once_per_cycle(r):
+    address_parser = AddressParser()
+    normalizer = CachedNormalizer(
+        address_parser,  # type: ignore[arg-type]
+        r,
+        prefix="bot-005",
+        ttl=3600,
+        cache_size=16,
+        version="1.0",
+    )
+    storage = Storage()
+    task = make_task(OutageDetailsParser(normalizer), storage, Publisher())
+
+    records = [
+        make_record("Ленина 1, 2; Мира 3"),
+        make_record("Ленина 5; Весны 7"),
+        make_record("Мира 60;\nплановое - ремонт"),
+    ]
+    assert await task.process(records) == "ok"
+
+    assert sorted(address_parser.calls) == ["Весны", "Ленина", "Мира"]
+    assert [[s.name for s in rec.details.streets] for rec in storage.committed] == [
+        ["улица Ленина", "улица Мира"],
+        ["улица Ленина", "улица Весны"],
+        ["улица Мира"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_falls_back_to_parsing_each_record():
+    storage = Storage()
+    task = make_task(SlowParser(3), storage, Publisher())
+    records = make_records(3)
+
+    assert await task._resolve_streets(records) is None
+    assert await task.process(records) == "ok"
+    assert len(storage.committed) == 3
+
+
+def fail_nth_xadd(r, n: int):
+    """Makes the `n`-th XADD queued in a pipeline fail with an invalid entry ID"""
+    pipeline = r.pipeline
+
+    def failing_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        xadd = pipe.xadd
+        queued = 0
+
+        def failing_xadd(name, fields, **kwargs):
+            nonlocal queued
+            queued += 1
+            if queued == n:
+                return pipe.execute_command("XADD", name, "invalid", "outage", "")
+            return xadd(name, fields, **kwargs)
+
+        pipe.xadd = failing_xadd
+        return pipe
+
+    r.pipeline = failing_pipeline
+
+
+@pytest.mark.asyncio
+async def test_failed_publish_is_left_out_of_commit(r):
+    storage = RedisStorage(r, "bot-005", ttl=3600)
+    task = make_task(
+        SlowParser(3), storage, RedisPublisher(r, "bot-005", modes=["stream"])
+    )
+
+    fail_nth_xadd(r, 2)
+    assert await task.process(make_records(3)) == "partial"
+    assert await r.xlen("bot-005:outages:stream") == 2
+
+    # Only the failed outage is changed on the next cycle
+    del r.pipeline
+    changed = await storage.diff(
+        [await task._fill_details(record) for record in make_records(3)]
+    )
+    assert [record.details.streets[0].name for record in changed] == ["1"]
+
+
+@pytest.mark.asyncio
+async def test_unchanged_rows_are_served_from_parsed_cache(monkeypatch):
+    address_parser = AddressParser()
+    outage_parser = OutageDetailsParser(address_parser)
+    storage = Storage()
+    task = make_task(outage_parser, storage, Publisher())
+
+    parsed: list[str] = []
+    parse = outage_parser.parse
+
+    async def counted_parse(address, resolved=None):
+        parsed.append(address)
+        return await parse(address, resolved)
+
+    organizations: list[str] = []
+    parse_organization = task.organization_parser.parse
+
+    def counted_parse_organization(organization):
+        organizations.append(organization)
+        return parse_organization(organization)
+
+    monkeypatch.setattr(outage_parser, "parse", counted_parse)
+    monkeypatch.setattr(task.organization_parser, "parse", counted_parse_organization)
+
+    records = [make_record("Ленина 1; Мира 3"), make_record("Весны 7")]
+    assert await task.process(records) == "ok"
+    first = storage.diffed
+    assert len(parsed) == len(organizations) == 2
+
+    # The same rows scraped again
+    parsed.clear()
+    organizations.clear()
+    address_parser.calls.clear()
+    assert await task.process([make_record(r.address) for r in records]) == "ok"
+
+    assert storage.diffed == first
+    assert (parsed, organizations, address_parser.calls) == ([], [], [])
+    assert (task.parsed_cache.hits, task.parsed_cache.misses) == (2, 2)
+
+    # A changed row is parsed again
+    assert await task.process([records[0], make_record("Весны 9")]) == "ok"
+
+    assert parsed == ["Весны 9"]
+    assert len(organizations) == 1
+    assert address_parser.calls == ["Весны"]
+    assert storage.diffed[1].details.streets[0].buildings == ["9"]
@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.scraper import HostLimits, Scraper
+from app.storage import Storage
+
+FIXTURE = Path(__file__).parent / "fixtures" / "Gorod.htm"
+
+
+class Validators:
+    """Keeps the validators of the sources the way Storage does"""
+
+    def __init__(self):
+        self.etags: dict[str | None, str] = {}
+
+    async def get_validators(self, source=None):
+        return self.etags.get(source), None
+
+    async def set_last_modified(self, last_modified, source=None):
+        pass
+
+    async def is_etag_changed(self, etag, source=None):
+        changed = self.etags.get(source) != etag
+        self.etags[source] = etag
+        return changed
+
+
+@pytest.mark.asyncio
+async def test_sources_share_client_and_keep_own_validators():
+    def handler(request: httpx.Request) -> httpx.Response:
+        etag = f'"{request.url.path}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304)
+        return httpx.Response(200, content=b"<table></table>", headers={"ETag": etag})
+
+    storage = Validators()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        limits = HostLimits(1)
+        scrapers = [
+            Scraper(
+                f"http://outages.local/{name}.htm",
+                storage=storage,  # type: ignore[arg-type]
+                source=name,
+                client=client,
+                host_limits=limits,
+            )
+            for name in ("water", "heat")
+        ]
+
+        for scraper in scrapers:
+            async with scraper:
+                await scraper.run()
+                assert scraper.changed
+        for scraper in scrapers:
+            await scraper.run()
+            assert not scraper.changed
+
+        assert not client.is_closed
+
+    assert storage.etags == {"water": '"/water.htm"', "heat": '"/heat.htm"'}
+
+
+@pytest.mark.asyncio
+async def test_body_digest_replaces_missing_etag(r):
+    page = FIXTURE.read_bytes()
+    changed_page = page.replace("Мира 60".encode("cp1251"), "Мира 62".encode("cp1251"))
+    pages = [page, page, changed_page]
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, content=pages[len(requests) - 1])
+
+    storage = Storage(r, "bot-005", ttl=3600)
+    async with Scraper(
+        "http://outages.local/Gorod.htm",
+        storage=storage,
+        transport=httpx.MockTransport(handler),
+    ) as scraper:
+        first = await scraper.run()
+        assert await scraper.run() == []
+        changed = await scraper.run()
+
+    assert first and "Мира 60" in first[1].address
+    assert changed and "Мира 62" in changed[1].address
+    # The stored digest is never sent as an ETag
+    assert all("If-None-Match" not in request.headers for request in requests)
+    etag, _ = await storage.get_validators()
+    assert etag.startswith("sha256:")
+
+
+def test_host_limits_are_per_host():
+    limits = HostLimits(2)
+
+    assert limits("http://a.local/1") is limits("http://a.local/2")
+    assert limits("http://a.local/1") is not limits("http://b.local/1")
@@ -0,0 +1,67 @@
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+from app.similarity import SimilarityIndex
+
+
+def brute_force(stored: list[tuple[str, int]], address: str, key: int) -> bool:
+    s = SequenceMatcher()
+    s.set_seq2(address)
+    for stored_address, stored_key in stored:
+        s.set_seq1(stored_address)
+        if s.ratio() > 0.8 and stored_key == key:
+            return True
+    return False
+
+
+def mutate(rng: random.Random, address: str) -> str:
+    chars = list(address)
+    for _ in range(rng.randint(0, 6)):
+        i = rng.randrange(len(chars) + 1)
+        op = rng.choice(["insert", "delete", "replace"])
+        if op == "insert" or not chars:
+            chars.insert(i, rng.choice("абвгд 1234;,"))
+        elif op == "delete" and i < len(chars):
+            del chars[i]
+        elif i < len(chars):
+            chars[i] = rng.choice("абвгд 1234;,")
+    return "".join(chars)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_brute_force(seed):
+    rng = random.Random(seed)
+    streets = ["улица Ленина", "проспект Мира", "Кольцевая улица", "улица Вильского"]
+    stored = [
+        (
+            f"{rng.choice(streets)} {rng.randint(1, 99)}, {rng.randint(1, 99)}",
+            rng.randint(0, 3),
+        )
+        for _ in range(150)
+    ]
+
+    index: SimilarityIndex[int] = SimilarityIndex(threshold=0.8)
+    for i, (address, key) in enumerate(stored):
+        index.add(address, key, i)
+
+    for _ in range(150):
+        address = mutate(rng, rng.choice(stored)[0])
+        key = rng.randint(0, 3)
+
+        match = index.find(address, key)
+
+        assert (match is not None) == brute_force(stored, address, key)
+        if match is not None:
+            assert stored[match[0]][1] == key
+            assert match[1] > 0.8
+
+
+def test_empty_addresses():
+    index: SimilarityIndex[str] = SimilarityIndex(threshold=0.8)
+    index.add("", "key", "empty")
+
+    assert index.find("", "key") == ("empty", 1.0)
+    assert index.find("", "other") is None
+    assert index.find("улица Ленина", "key") is None
@@ -0,0 +1,321 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from apis.models import OrganizationInfo, OutageDetails, Reason, ResourceType, Street
+
+from app.publisher import ParsedRecord
+from app.scheduler import Janitor
+from app.storage import Storage
+
+START = datetime(2025, 6, 1, 9)
+
+
+def make_record(i: int, start: datetime = START) -> ParsedRecord:
+    return ParsedRecord(
+        area="Кировский район",
+        organization=OrganizationInfo(
+            resource_type=ResourceType.HOT_WATER,
+            resource="Горячее водоснабжение",
+            organization="АО КТТК",
+            phones=["205-05-00"],
+        ),
+        details=OutageDetails(
+            streets=[Street(name=f"улица Ленина {i}", buildings=[str(i)])],
+            reason=Reason(type="плановое", description="ремонт"),
+        ),
+        dates=[start, start + timedelta(hours=8)],
+    )
+
+
+def record_commands(r, monkeypatch) -> list[tuple]:
+    """Records the commands sent to `r`, pipelined ones included"""
+    commands: list[tuple] = []
+
+    execute_command = r.execute_command
+
+    async def recorded_command(*args, **options):
+        commands.append(args)
+        return await execute_command(*args, **options)
+
+    pipeline = r.pipeline
+
+    def recorded_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def recorded_execute(*args, **kwargs):
+            stack = [command for command, _ in pipe.command_stack]
+            if pipe.is_transaction:
+                stack = [("MULTI",), *stack, ("EXEC",)]
+            commands.extend(stack)
+            return await execute(*args, **kwargs)
+
+        pipe.execute = recorded_execute
+        return pipe
+
+    monkeypatch.setattr(r, "execute_command", recorded_command)
+    monkeypatch.setattr(r, "pipeline", recorded_pipeline)
+    return commands
+
+
+@pytest.mark.asyncio
+async def test_diff_asks_only_about_candidates(r, monkeypatch):
+    storage = Storage(r, "bot-005", ttl=3600)
+    stored = [make_record(i) for i in range(10)]
+    await storage.commit(stored)
+
+    commands = record_commands(r, monkeypatch)
+    candidates = [stored[3], make_record(10), stored[7]]
+    assert await storage.diff(candidates) == [candidates[1]]
+
+    assert commands == [
+        ("HEXISTS", "bot-005:records_v3", storage.fingerprint(record))
+        for record in candidates
+    ]
+
+
+@pytest.mark.asyncio
+async def test_mirror_reloads_after_commit_elsewhere(r, monkeypatch):
+    mirrored = Storage(r, "bot-005", ttl=3600, mirror=True)
+    other = Storage(r, "bot-005", ttl=3600, mirror=True)
+    await mirrored.migrate()
+    await other.migrate()
+    version = int(await r.get("bot-005:version"))
+
+    record = make_record(1)
+    await other.commit([record])
+    assert int(await r.get("bot-005:version")) == version + 1
+
+    commands = record_commands(r, monkeypatch)
+    assert await mirrored.diff([record]) == []
+    assert ("HKEYS", "bot-005:records_v3") in commands
+    assert mirrored.mirror.version == version + 1
+
+
+@pytest.mark.asyncio
+async def test_mirror_diff_reads_only_version(r, monkeypatch):
+    storage = Storage(r, "bot-005", ttl=3600, mirror=True)
+    await storage.migrate()
+    stored = [make_record(i) for i in range(3)]
+    # Own commits are applied to the mirror without reloading
+    await storage.commit(stored[:2])
+    await storage.commit(stored[2:])
+
+    commands = record_commands(r, monkeypatch)
+    assert await storage.diff([*stored, make_record(3)]) == [make_record(3)]
+    assert await storage.diff(stored) == []
+
+    assert commands == [("GET", "bot-005:version")] * 2
+
+
+@pytest.mark.asyncio
+async def test_mirror_drops_expired_fingerprints(r, monkeypatch):
+    storage = Storage(r, "bot-005", ttl=3600, mirror=True)
+    await storage.migrate()
+    expired, fresh = make_record(1), make_record(2)
+    await storage.commit([expired])
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 3601)
+    assert await storage.diff([expired]) == [expired]
+
+    await storage.commit([fresh])
+    assert list(storage.mirror.fingerprints) == [storage.fingerprint(fresh)]
+
+
+@pytest.mark.asyncio
+async def test_commit_is_one_transaction_with_ttls(r, monkeypatch):
+    storage = Storage(r, "bot-005", ttl=3600)
+    records = [make_record(i) for i in range(2)]
+    fingerprints = [storage.fingerprint(record) for record in records]
+
+    commands = record_commands(r, monkeypatch)
+    await storage.commit(records)
+
+    assert [command[0] for command in commands] == [
+        "MULTI",
+        "HSET",
+        "HEXPIRE",
+        "INCRBY",
+        "EXEC",
+    ]
+    assert all(
+        0 < ttl <= 3600 for ttl in await r.httl("bot-005:records_v3", *fingerprints)
+    )
+    assert await r.get("bot-005:version") == "1"
+
+
+@pytest.mark.asyncio
+async def test_legacy_commit_writes_both_schemas_in_one_transaction(r, monkeypatch):
+    storage = Storage(r, "bot-005", ttl=3600, legacy_v1=True)
+    record = make_record(1)
+
+    commands = record_commands(r, monkeypatch)
+    await storage.commit([record])
+
+    assert [command[0] for command in commands] == [
+        "MULTI",
+        "HSET",
+        "HEXPIRE",
+        "SADD",
+        "ZADD",
+        "HSET",
+        "INCRBY",
+        "EXEC",
+    ]
+    assert await r.hexists("bot-005:records_v2", storage.hash_v2(record))
+    assert await r.sismember("bot-005:items", storage.hash(record))
+
+
+@pytest.mark.asyncio
+async def test_commit_reports_fields_without_ttl(r, caplog):
+    # A zero TTL deletes the fields instead of setting their expiry
+    storage = Storage(r, "bot-005", ttl=0)
+
+    await storage.commit([make_record(1)])
+
+    assert "Failed to set TTL of 1 records" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_cleanup_removes_outdated_records_in_batches(r, monkeypatch):
+    storage = Storage(r, "bot-005", ttl=3600, legacy_v1=True, mirror=True)
+    await storage.migrate()
+    records = [make_record(i) for i in range(7)]
+    await storage.commit(records)
+    hashes = [storage.hash(record) for record in records]
+    # Committed more than a TTL ago, behind the back of the mirror
+    await r.zadd("bot-005:ttls", dict.fromkeys(hashes[:5], time.time() - 3601))
+
+    commands = record_commands(r, monkeypatch)
+    assert await storage.cleanup(batch_size=2) == 5
+
+    batches = [len(command) - 2 for command in commands if command[0] == "ZREM"]
+    assert batches == [2, 2, 1]
+    assert await r.smembers("bot-005:items") == set(hashes[5:])
+    assert set(await r.hkeys("bot-005:records")) == set(hashes[5:])
+    assert await r.zrange("bot-005:ttls", 0, -1) == sorted(hashes[5:])
+    assert storage.mirror.v1_hashes == set(hashes[5:])
+    assert set(storage.mirror.v1_records) == set(hashes[5:])
+
+
+@pytest.mark.asyncio
+async def test_cleanup_leaves_fingerprints_to_field_ttls(r):
+    storage = Storage(r, "bot-005", ttl=3600)
+    await storage.commit([make_record(1)])
+
+    assert await storage.cleanup() == 0
+    assert await r.hlen("bot-005:records_v3") == 1
+
+
+class BrokenStorage:
+    async def cleanup(self, batch_size: int):
+        raise ConnectionError("Redis is down")
+
+
+@pytest.mark.asyncio
+async def test_janitor_survives_cleanup_errors(caplog):
+    janitor = Janitor(BrokenStorage(), interval=60)  # type: ignore[arg-type]
+
+    await janitor.run()
+
+    assert "Failed to clean up storage" in caplog.text
+
+
+async def commit_v1(r, records: list[ParsedRecord]) -> Storage:
+    """Stores `records` the way an instance running schema 1 does"""
+    storage = Storage(r, "bot-005", ttl=3600, legacy_v1=True)
+    await storage.migrate()
+    await storage.commit(records)
+    return storage
+
+
+@pytest.mark.asyncio
+async def test_migrate_converts_v1_to_v3(r):
+    records = [make_record(i) for i in range(5)]
+    legacy = await commit_v1(r, records)
+    expiration = await r.hexpiretime(
+        "bot-005:records_v2", *[legacy.hash_v2(record) for record in records]
+    )
+
+    storage = Storage(r, "bot-005", ttl=3600)
+    await storage.migrate(batch_size=2)
+
+    assert await r.get("bot-005:schema") == "3"
+    assert not await r.exists(
+        "bot-005:items", "bot-005:ttls", "bot-005:records", "bot-005:records_v2"
+    )
+    fingerprints = [storage.fingerprint(record) for record in records]
+    assert await r.hexpiretime("bot-005:records_v3", *fingerprints) == expiration
+    # Nothing is published again
+    assert await storage.diff(records) == []
+
+
+@pytest.mark.asyncio
+async def test_migrate_resumes_interrupted_step(r, monkeypatch):
+    records = [make_record(i) for i in range(5)]
+    await commit_v1(r, records)
+
+    hexpiretime = r.hexpiretime
+    calls = 0
+
+    async def failing_hexpiretime(*args):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise ConnectionError("Redis is down")
+        return await hexpiretime(*args)
+
+    monkeypatch.setattr(r, "hexpiretime", failing_hexpiretime)
+    with pytest.raises(ConnectionError):
+        await Storage(r, "bot-005", ttl=3600).migrate(batch_size=2)
+
+    # Schema 2 is done, the first batch is already converted
+    assert await r.get("bot-005:schema") == "2"
+    assert await r.hlen("bot-005:records_v2") == 3
+    assert await r.hlen("bot-005:records_v3") == 2
+
+    storage = Storage(r, "bot-005", ttl=3600)
+    await storage.migrate(batch_size=2)
+
+    assert await r.get("bot-005:schema") == "3"
+    assert not await r.exists("bot-005:records_v2")
+    assert await storage.diff(records) == []
+
+
+@pytest.mark.asyncio
+async def test_migrate_waits_for_other_instance(r):
+    await commit_v1(r, [make_record(1)])
+    lock = r.lock("bot-005:schema:lock", timeout=60)
+    await lock.acquire()
+
+    migration = asyncio.create_task(Storage(r, "bot-005", ttl=3600).migrate())
+    await asyncio.sleep(0.2)
+    assert not migration.done()
+    assert await r.get("bot-005:schema") is None
+
+    await lock.release()
+    await asyncio.wait_for(migration, timeout=5)
+    assert await r.get("bot-005:schema") == "3"
+
+
+@pytest.mark.asyncio
+async def test_legacy_migrate_keeps_v1_keys(r):
+    record = make_record(1)
+    storage = await commit_v1(r, [record])
+
+    await storage.migrate()
+
+    assert await r.get("bot-005:schema") is None
+    assert await r.sismember("bot-005:items", storage.hash(record))
+    assert await r.hexists("bot-005:records_v2", storage.hash_v2(record))
+
+
+@pytest.mark.asyncio
+async def test_legacy_migrate_rejects_newer_schema(r):
+    await Storage(r, "bot-005", ttl=3600).migrate()
+
+    with pytest.raises(RuntimeError, match="newer"):
+        await Storage(r, "bot-005", ttl=3600, legacy_v1=True).migrate()
@@ -0,0 +1,49 @@
+import httpx
+import pytest
+
+from app.transport import (
+    ResponseTooLargeError,
+    RetryBudget,
+    RetryPolicy,
+    iter_limited,
+)
+
+
+def client_for(statuses: list[int | Exception]) -> httpx.AsyncClient:
+    answers = iter(statuses)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            raise answer
+        return httpx.Response(answer, content=b"page")
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_retries_failures_until_success():
+    retry = RetryPolicy(retries=3, backoff=0)
+    async with client_for([httpx.ConnectError("refused"), 503, 200]) as client:
+        response = await retry.send(client, client.build_request("GET", "http://a/"))
+
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_returns_last_failure_without_budget():
+    retry = RetryPolicy(retries=3, backoff=0, budget=RetryBudget(ratio=0, reserve=1))
+    async with client_for([502, 503, 200]) as client:
+        response = await retry.send(client, client.build_request("GET", "http://a/"))
+
+    assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_body_size_is_limited():
+    response = httpx.Response(200, content=b"x" * 100)
+    del response.headers["Content-Length"]
+
+    with pytest.raises(ResponseTooLargeError):
+        async for _ in iter_limited(response, 10):
+            pass